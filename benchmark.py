@@ -0,0 +1,262 @@
+﻿import argparse, json, os, platform, statistics, sys, tempfile, time
+import extractor as ex
+import models
+import parameter_sheet_to_json as converter
+import sheet_writer
+import openpyxl as px
+
+# generate synthetic parameter sheet with the layouts parameter_sheet_to_json.py reads,
+# and measure load, extract, convert and JSON write separately.
+
+def ls_device(i):
+    return models.LogicalSwitch(
+        name = "LS{:04d}".format(i),
+        description = "logical switch {}".format(i),
+        transport_zone = "TZ01",
+        replication_mode = "UNICAST_MODE" if i % 2 else "HYBRID_MODE",
+        enable_ip_discovery = True,
+        enable_mac_learning = bool(i % 2),
+    )
+
+def syslog(servers):
+    return models.Syslog(syslog_servers = servers, protocol = "udp")
+
+# routing settings shared by ESG and DLR. router IDs are 10.255.x.x for ESGs and 10.254.x.x for DLRs.
+def routing(device, i, neighbors, static_routes, prefixes, criteria, dlr = False):
+    default_gateway = models.DefaultGateway(vnic = "Uplink", gateway_ip = "10.0.0.1", mtu = 1500)
+    if not dlr: default_gateway.admin_distance = 1
+    device.global_configuration = models.GlobalConfiguration(
+        router_id = "10.{}.{}.{}".format(254 if dlr else 255, i // 256 % 256, i % 256),
+        ecmp = True,
+        default_gateway = default_gateway,
+    )
+    device.static_route = [models.StaticRoute(network = "192.168.{}.0/24".format(r % 256), next_hop = "10.0.0.254") for r in range(static_routes)]
+
+    neighbor_list = []
+    for n in range(neighbors):
+        ip_address = "172.16.{}.{}".format(i % 256, n % 254 + 1)
+        if dlr:
+            neighbor = models.DlrBgpNeighbor(interface = "Uplink", ip_address = ip_address,
+                forwarding_address = "172.16.{}.253".format(i % 256), protocol_address = "172.16.{}.254".format(i % 256), remote_as = 65100 + n)
+        else:
+            neighbor = models.EsgBgpNeighbor(ip_address = ip_address, remote_as = 65100 + n, remove_private_as = True)
+        neighbor.weight = 60
+        neighbor.keep_alive_time = 60
+        neighbor.hold_down_time = 180
+        neighbor.password = ""
+        neighbor_list.append(neighbor)
+
+    if dlr:
+        device.ospf = models.DlrOspf(status = False, protocol_address = "", forwarding_address = "", graceful_restart = True)
+        device.bgp = models.Bgp(status = True, graceful_restart = True, local_as = 65000, neighbors = neighbor_list)
+    else:
+        device.ospf = models.EsgOspf(status = False, graceful_restart = True, default_originate = False)
+        device.bgp = models.Bgp(status = True, local_as = 65000, graceful_restart = True, default_originate = False, neighbors = neighbor_list)
+
+    device.route_redistribution = models.RouteRedistribution(
+        ip_prefixes = [models.IPPrefix(name = "prefix{}".format(p), ip_network = "10.{}.0.0/16".format(p % 256)) for p in range(prefixes)],
+        route_redistribution_table = [models.RedistributionCriteria(
+            prefix_name = "prefix{}".format(c),
+            learner_protocol = "BGP",
+            allow_learning_from = models.AllowLearningFrom(ospf = False, bgp = False, static_routes = True, connected = True),
+            action = "Permit",
+        ) for c in range(criteria)],
+    )
+
+def esg_device(i, vnics, logical_switches, neighbors, static_routes, prefixes, criteria):
+    name = "ESG{:04d}".format(i)
+    esg = models.Esg(
+        name = name,
+        hostname = name.lower(),
+        enable_high_availability = True,
+        password = "VMware1!VMware1!",
+        enable_ssh_access = True,
+        enable_fips_mode = False,
+        enable_auto_rule_generation = True,
+        edge_control_level_logging = "info",
+        datacenter = "DC01",
+        appliance_size = "xlarge" if i % 2 else "large",
+        cluster = "Cluster01",
+        datastore = "Datastore00",
+        host = ["esxi00", "esxi01"],
+        folder = "vm" if i % 2 else "Edges",
+        ha_datastore = "Datastore01",
+        configure_default_gateway = True,
+        gateway_vnic = "Uplink",
+        gateway_ip = "10.0.{}.1".format(i % 256),
+        gateway_mtu = 1500,
+        gateway_admin_distance = 1,
+        configure_firewall_default_policy = True,
+        default_traffic_policy = "Accept",
+        default_firewall_logging = False,
+        ha_vnic = "any",
+        ha_declare_dead_time = 15,
+        ha_management_ips = "",
+        syslog = syslog(["192.168.0.10"]),
+        interfaces = [models.EsgInterface(
+            name = "vnic{}".format(v),
+            type = "Uplink" if v == 0 else "Internal",
+            connected_to = "LS{:04d}".format((i * vnics + v) % max(logical_switches, 1)),
+            primary_ip_address = "10.{}.{}.1".format(i % 256, v % 256),
+            secondary_ip_address = "",
+            subnet_prefix_length = 24,
+            mtu = 1500,
+            enable_proxy_arp = False,
+            send_icmp_redirect = True,
+            reverse_path_filter = "enabled",
+        ) for v in range(vnics)],
+    )
+    routing(esg, i, neighbors, static_routes, prefixes, criteria)
+    return esg
+
+def dlr_device(i, lifs, logical_switches, neighbors, static_routes, prefixes, criteria, bridges):
+    name = "DLR{:04d}".format(i)
+    dlr = models.Dlr(
+        universal = False,
+        local_egress = False,
+        name = name,
+        hostname = name.lower(),
+        enable_high_availability = True,
+        password = "VMware1!VMware1!",
+        enable_ssh_access = True,
+        enable_fips_mode = False,
+        edge_control_level_logging = "info",
+        datacenter = "DC01",
+        cluster = "Cluster01",
+        datastore = "Datastore00",
+        host = ["", ""],
+        folder = "DLRs",
+        ha_datastore = "Datastore01",
+        connected_to = "PG-MGMT",
+        primary_ip_address = "",
+        subnet_prefix_length = "",
+        configure_default_gateway = False,
+        gateway_vnic = "",
+        gateway_ip = "",
+        gateway_mtu = "",
+        gateway_admin_distance = "",
+        syslog = syslog(["192.168.0.10", "192.168.0.11"]),
+        interfaces = [models.DlrInterface(
+            name = "lif{}".format(v),
+            type = "Uplink" if v == 0 else "Internal",
+            connected_to = "LS{:04d}".format((i + v) % max(logical_switches, 1)),
+            # each LIF of all DLRs has its own subnet in 100.64.0.0/10, apart from 10.x.x.x of ESG vNICs.
+            primary_ip_address = "100.{}.{}.1".format(64 + (i * lifs + v) // 256 % 64, (i * lifs + v) % 256),
+            subnet_prefix_length = 24,
+            mtu = 1500,
+        ) for v in range(lifs)],
+    )
+    routing(dlr, i, neighbors, static_routes, prefixes, criteria, dlr = True)
+    dlr.bridge = [models.Bridge(
+        name = "bridge{}".format(b),
+        logical_switch = "LS{:04d}".format((i + b) % max(logical_switches, 1)),
+        distributed_port_group = "PG-VLAN{}".format(100 + b),
+    ) for b in range(bridges)]
+    return dlr
+
+# synthetic devices are written by sheet_writer, in the same layouts as real parameter sheet.
+def generate_workbook(path, edges = 10, dlrs = 2, logical_switches = 20, vnics = 10, lifs = 4,
+                      neighbors = 2, static_routes = 2, prefixes = 2, criteria = 2, bridges = 2):
+    sheet_writer.write_workbook(path,
+        (ls_device(i) for i in range(logical_switches)),
+        (esg_device(i, vnics, logical_switches, neighbors, static_routes, prefixes, criteria) for i in range(edges)),
+        (dlr_device(i, lifs, logical_switches, neighbors, static_routes, prefixes, criteria, bridges) for i in range(dlrs)))
+
+def measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return [result, time.perf_counter() - start]
+
+def load_grids(parameter_sheet):
+    grids = {}
+    wb = px.load_workbook(parameter_sheet, read_only = True, data_only = True)
+    try:
+        for sheet_name, _ in converter.SHEETS:
+            grids[sheet_name] = ex.Grid(wb[sheet_name])
+    finally:
+        wb.close()
+    return grids
+
+def extract_grids(grids):
+    return {sheet_name: ex.extract(grids[sheet_name], sheet_type = sheet_type) for sheet_name, sheet_type in converter.SHEETS}
+
+def run_once(parameter_sheet, output_dir):
+    timings = {}
+    grids, timings["load"] = measure(load_grids, parameter_sheet)
+    ws_data, timings["extract"] = measure(extract_grids, grids)
+    converted, timings["convert"] = measure(converter.convert_all, ws_data)
+    _, timings["write"] = measure(converter.write_outputs, output_dir, converted)
+    timings["total"] = sum(timings.values())
+    return timings
+
+def summarize(samples):
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+    }
+
+def run_benchmark(parameter_sheet, repeat = 3):
+    runs = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for _ in range(repeat):
+            runs.append(run_once(parameter_sheet, output_dir))
+
+    return {stage: summarize([run[stage] for run in runs]) for stage in runs[0]}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark parameter sheet conversion with synthetic workbook.")
+    parser.add_argument("--edges", type = int, default = 100, help = "number of ESGs")
+    parser.add_argument("--dlrs", type = int, default = 20, help = "number of DLRs")
+    parser.add_argument("--logical-switches", type = int, default = 200, help = "number of logical switches")
+    parser.add_argument("--vnics", type = int, default = 10, help = "number of vNICs per ESG")
+    parser.add_argument("--lifs", type = int, default = 4, help = "number of interfaces per DLR")
+    parser.add_argument("--neighbors", type = int, default = 4, help = "number of BGP neighbors per ESG/DLR")
+    parser.add_argument("--static-routes", type = int, default = 4, help = "number of static routes per ESG/DLR")
+    parser.add_argument("--prefixes", type = int, default = 2, help = "number of IP prefixes per ESG/DLR")
+    parser.add_argument("--criteria", type = int, default = 2, help = "number of redistribution criteria per ESG/DLR")
+    parser.add_argument("--bridges", type = int, default = 2, help = "number of bridges per DLR")
+    parser.add_argument("--repeat", type = int, default = 3, help = "number of measurements (default: 3)")
+    parser.add_argument("--workbook", help = "path to save generated workbook (default: temporary file)")
+    parser.add_argument("--output", help = "path to write JSON report (default: stdout)")
+    args = parser.parse_args()
+
+    sizes = {
+        "edges": args.edges,
+        "dlrs": args.dlrs,
+        "logical_switches": args.logical_switches,
+        "vnics": args.vnics,
+        "lifs": args.lifs,
+        "neighbors": args.neighbors,
+        "static_routes": args.static_routes,
+        "prefixes": args.prefixes,
+        "criteria": args.criteria,
+        "bridges": args.bridges,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parameter_sheet = args.workbook or os.path.join(tmp_dir, "benchmark.xlsx")
+        try:
+            _, generate_seconds = measure(generate_workbook, parameter_sheet, *sizes.values())
+        except ValueError as e:
+            print(e, file = sys.stderr)
+            sys.exit(1)
+
+        report = {
+            "python": platform.python_version(),
+            "openpyxl": px.__version__,
+            "sizes": sizes,
+            "workbook_bytes": os.path.getsize(parameter_sheet),
+            "generate_seconds": generate_seconds,
+            "repeat": args.repeat,
+            "seconds": run_benchmark(parameter_sheet, args.repeat),
+        }
+
+    text = json.dumps(report, indent = 4)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
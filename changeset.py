@@ -0,0 +1,109 @@
+﻿import json, os, tempfile
+import models
+
+# compare converted devices with previous output and write only changed files.
+
+# converted devices are records of models, and they are serialized by models.to_json.
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False, indent=4, sort_keys=True, separators=(',', ': '), default=models.to_json)
+
+# one device per line for JSON Lines output.
+def dumps_line(device):
+    return json.dumps(device, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=models.to_json)
+
+def dumps_as(data, output_format = "json"):
+    if output_format == "jsonl": return "".join(dumps_line(device) + "\n" for device in data)
+    return dumps(data)
+
+# permission of existing file, or the same permission as open() creates.
+def file_mode(path):
+    try:
+        return os.stat(path).st_mode & 0o777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+# write chunks to temporary file in the directory of path and return its path.
+# chunks may be a generator. the temporary file is removed when writing fails.
+def write_temporary(path, chunks):
+    mode = file_mode(path)
+    fd, tmp_path = tempfile.mkstemp(dir = os.path.dirname(path) or ".", prefix = "." + os.path.basename(path), suffix = ".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for chunk in chunks: f.write(chunk)
+        os.chmod(tmp_path, mode)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    return tmp_path
+
+# write text to temporary file and rename it, so readers never see partial file.
+def write_atomic(path, text):
+    tmp_path = write_temporary(path, [text])
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+# write text only when it differs from the current file. returns True when written.
+def write_if_changed(path, text):
+    try:
+        with open(path) as f:
+            if f.read() == text: return False
+    except (OSError, ValueError):
+        pass
+    write_atomic(path, text)
+    return True
+
+def load_previous(path):
+    try:
+        with open(path) as f:
+            if path.endswith(".jsonl"): return [json.loads(line) for line in f if line.strip()]
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+# load converted files of sections in confdir. '<section>.jsonl' is read when '<section>.json' does not exist.
+# unlike load_previous(), missing or invalid files raise ValueError, so tools never check an empty list by mistake.
+def load_sections(confdir, sections):
+    result = []
+    for section in sections:
+        path = os.path.join(confdir, section + ".json")
+        if not os.path.exists(path): path = os.path.join(confdir, section + ".jsonl")
+        if not os.path.exists(path): raise ValueError("{0}.json or {0}.jsonl is not found in {1}.".format(section, confdir))
+        try:
+            with open(path) as f:
+                if path.endswith(".jsonl"):
+                    data = [json.loads(line) for line in f if line.strip()]
+                else:
+                    data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError("{} cannot be loaded: {}".format(path, e)) from None
+        if not isinstance(data, list): raise ValueError("{} is not a list of devices.".format(path))
+        result.append(data)
+    return result
+
+def group_by_name(device_list, name_key = "Name"):
+    groups = {}
+    for d in device_list:
+        groups.setdefault(d.get(name_key), []).append(d)
+    return groups
+
+# compare device lists by name and return names of added, changed and removed devices.
+def compare(old_list, new_list, name_key = "Name"):
+    old_groups = group_by_name(old_list, name_key)
+    new_groups = group_by_name(new_list, name_key)
+
+    changes = {"added": [], "changed": [], "removed": []}
+    for name, devices in new_groups.items():
+        if name not in old_groups:
+            changes["added"].append(name)
+        elif dumps(old_groups[name]) != dumps(devices):
+            changes["changed"].append(name)
+    for name in old_groups:
+        if name not in new_groups:
+            changes["removed"].append(name)
+
+    return changes
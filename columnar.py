@@ -0,0 +1,175 @@
+﻿import argparse, csv, os, sys
+import changeset
+import models
+import validation
+
+# flat tables of routing settings for analysis across devices and sites.
+#
+# each table has one row per BGP neighbor, static route, IP prefix or redistribution criteria,
+# keyed by site (workbook or directory name), section (esg or dlr) and device name.
+# tables are built column by column with a type for each column, and written as CSV,
+# or as Parquet when pyarrow is installed.
+# BGP passwords are not exported.
+
+# table name -> [(column, key of flat row, type)]. keys of ESG-only or DLR-only fields are empty for the other.
+# AS numbers may be written in asdot notation like 1.10, and they are read by validation.parse_as().
+TABLES = {
+    "bgp_neighbors": [
+        ("local_as", "LocalAS", "as"),
+        ("ip_address", "IPAddress", "str"),
+        ("remote_as", "RemoteAS", "as"),
+        ("interface", "Interface", "str"),
+        ("forwarding_address", "ForwardingAddress", "str"),
+        ("protocol_address", "ProtocolAddress", "str"),
+        ("remove_private_as", "RemovePrivateAS", "bool"),
+        ("weight", "Weight", "int"),
+        ("keep_alive_time", "KeepAliveTime", "int"),
+        ("hold_down_time", "HoldDownTime", "int"),
+    ],
+    "static_routes": [
+        ("network", "Network", "str"),
+        ("next_hop", "NextHop", "str"),
+    ],
+    "ip_prefixes": [
+        ("name", "Name", "str"),
+        ("ip_network", "IP/Network", "str"),
+    ],
+    "redistribution_criteria": [
+        ("prefix_name", "PrefixName", "str"),
+        ("learner_protocol", "LearnerProtocol", "str"),
+        ("allow_ospf", "AllowLearningFrom.OSPF", "bool"),
+        ("allow_bgp", "AllowLearningFrom.BGP", "bool"),
+        ("allow_static_routes", "AllowLearningFrom.StaticRoutes", "bool"),
+        ("allow_connected", "AllowLearningFrom.Connected", "bool"),
+        ("action", "Action", "str"),
+    ],
+}
+
+KEY_COLUMNS = [("site", "str"), ("section", "str"), ("device", "str")]
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet"}
+
+# cell values are converted to the type of column. empty or invalid values are None.
+def cast(value, column_type):
+    if value is None or value == "": return None
+    if column_type == "as":
+        return validation.parse_as(value)
+    if column_type == "int":
+        if isinstance(value, bool): return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if column_type == "bool":
+        return value if isinstance(value, bool) else None
+    return str(value)
+
+def column_types(table):
+    return KEY_COLUMNS + [(column, column_type) for column, _, column_type in TABLES[table]]
+
+# item as one flat row. keys of nested items are joined by '.', like 'AllowLearningFrom.OSPF'.
+def flat_row(item, prefix = ""):
+    if isinstance(item, models.Record): item = item.to_json()
+    row = {}
+    for key, value in item.items():
+        if isinstance(value, (dict, models.Record)):
+            row.update(flat_row(value, prefix + key + "."))
+        else:
+            row[prefix + key] = value
+    return row
+
+# items of each table in a device, as flat rows. BGP neighbors also have LocalAS of the device.
+def device_rows(device):
+    bgp = device["Bgp"]
+    redistribution = device["RouteRedistribution"]
+    yield from (["bgp_neighbors", dict(flat_row(n), LocalAS = bgp["LocalAS"])] for n in bgp["Neighbors"])
+    yield from (["static_routes", flat_row(r)] for r in device["StaticRoute"])
+    yield from (["ip_prefixes", flat_row(p)] for p in redistribution["IPPrefixes"])
+    yield from (["redistribution_criteria", flat_row(c)] for c in redistribution["RouteRedistributionTable"])
+
+# returns {table name: {column: list of values}}.
+def build_tables(esg_list, dlr_list, site = ""):
+    tables = {table: {column: [] for column, _ in column_types(table)} for table in TABLES}
+
+    for section, device_list in [["esg", esg_list], ["dlr", dlr_list]]:
+        for device in device_list:
+            for table, row in device_rows(device):
+                columns = tables[table]
+                columns["site"].append(site)
+                columns["section"].append(section)
+                columns["device"].append(device["Name"])
+                for column, key, column_type in TABLES[table]:
+                    columns[column].append(cast(row.get(key), column_type))
+
+    return tables
+
+# concatenate tables of several sites.
+def concat_tables(tables_list):
+    result = {table: {column: [] for column, _ in column_types(table)} for table in TABLES}
+    for tables in tables_list:
+        for table, columns in tables.items():
+            for column, values in columns.items():
+                result[table][column].extend(values)
+    return result
+
+def write_csv(path, columns):
+    with open(path, "w", newline = "", encoding = "utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(columns))
+        writer.writerows(zip(*columns.values()))
+
+# pyarrow is optional, and imported only when Parquet is written.
+def require_pyarrow():
+    try:
+        import pyarrow, pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("pyarrow is required to write Parquet files. Install it by 'pip install pyarrow'.") from None
+    return pyarrow
+
+def write_parquet(path, table, columns):
+    pa = require_pyarrow()
+    pq = pa.parquet
+
+    arrow_types = {"str": pa.string(), "int": pa.int64(), "as": pa.int64(), "bool": pa.bool_()}
+    schema = pa.schema([(column, arrow_types[column_type]) for column, column_type in column_types(table)])
+    pq.write_table(pa.table(columns, schema = schema), path)
+
+# write '<table name>.csv' or '<table name>.parquet' into output_dir.
+def write_tables(output_dir, tables, output_format = "csv"):
+    paths = []
+    for table, columns in tables.items():
+        path = os.path.join(output_dir, table + FORMATS[output_format])
+        if output_format == "parquet":
+            write_parquet(path, table, columns)
+        else:
+            write_csv(path, columns)
+        paths.append(path)
+    return paths
+
+# export converted files of one or more sites into one set of tables.
+def main():
+    parser = argparse.ArgumentParser(description = "Export routing settings of converted JSON files as flat tables.")
+    parser.add_argument("confdirs", nargs = "+", help = "directories of esg and dlr files. the directory name is used as site")
+    parser.add_argument("--output-dir", default = ".", help = "directory to write tables (default: current directory)")
+    parser.add_argument("--format", choices = sorted(FORMATS), default = "csv", help = "table format (default: csv)")
+    args = parser.parse_args()
+
+    tables_list = []
+    for confdir in args.confdirs:
+        try:
+            sections = changeset.load_sections(confdir, ["esg", "dlr"])
+        except ValueError as e:
+            print(e, file = sys.stderr)
+            sys.exit(1)
+        tables_list.append(build_tables(*sections, site = os.path.basename(os.path.normpath(confdir))))
+
+    os.makedirs(args.output_dir, exist_ok = True)
+    try:
+        for path in write_tables(args.output_dir, concat_tables(tables_list), args.format):
+            print(path)
+    except RuntimeError as e:
+        print(e, file = sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
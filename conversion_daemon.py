@@ -0,0 +1,281 @@
+﻿import argparse, json, os, posixpath, sys, threading, time, zipfile
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+import changeset
+import extractor as ex
+import mapping
+import parameter_sheet_to_json as converter
+import sheet_cache
+import openpyxl as px
+
+# long-running converter.
+# it watches parameter sheets, keeps extracted sheets and converted sections in memory,
+# and reconverts only the sheets changed since the last conversion.
+#
+#   GET /status                            status of all workbooks
+#   GET /<workbook>/<ls|esg|dlr>.json      converted section, same as the output file
+#   GET /<workbook>/<ls|esg|dlr>/<name>    one converted device
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# errors of a file in the middle of saving. a file failing with them is retried RETRIES times with backoff,
+# and a file failing with other errors is not converted again until it is changed.
+TRANSIENT_ERRORS = (OSError, EOFError, zipfile.BadZipFile)
+RETRIES = 3
+RETRY_SECONDS = 0.5
+
+# signature of each sheet from CRC of its zip member, without parsing cells.
+# shared strings are included because cells may refer to them.
+def sheet_signatures(path):
+    signatures = {}
+    try:
+        with zipfile.ZipFile(path) as z:
+            members = {info.filename: "{:08x}:{}".format(info.CRC, info.file_size) for info in z.infolist()}
+            shared_strings = members.get("xl/sharedStrings.xml", "")
+
+            targets = {}
+            for rel in ET.fromstring(z.read("xl/_rels/workbook.xml.rels")).iter(NS_PKG_REL + "Relationship"):
+                target = rel.get("Target")
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join("xl", target))
+                targets[rel.get("Id")] = target
+
+            for sheet in ET.fromstring(z.read("xl/workbook.xml")).iter(NS_MAIN + "sheet"):
+                member = targets.get(sheet.get(NS_REL + "id"))
+                if member in members:
+                    signatures[sheet.get("name")] = members[member] + "/" + shared_strings
+    except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError):
+        # unknown layout. all sheets are compared by their content.
+        return {}
+    return signatures
+
+# parameter sheet kept warm in memory.
+class WarmWorkbook:
+    def __init__(self, path, output_dir = None):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.stat = None
+        self.signatures = {}
+        self.sheet_hashes = {}
+        self.ws_data = {}
+        self.section_keys = {}
+        self.sections = {}
+        self.texts = {}
+        self.converted_at = None
+        self.last_seconds = None
+        self.last_changed_sheets = []
+        self.error = None
+        self.failed_stat = None
+        self.failures = 0
+        self.retry_at = 0
+
+    # reconvert when the file is changed. returns True when any section is reconverted.
+    def refresh(self):
+        with self.lock:
+            try:
+                st = os.stat(self.path)
+            except OSError as e:
+                self.error = "{}: {}".format(type(e).__name__, e)
+                return False
+            stat = (st.st_mtime_ns, st.st_size)
+            if stat == self.stat: return False
+            if stat == self.failed_stat and (self.failures >= RETRIES or time.monotonic() < self.retry_at): return False
+
+            start = time.perf_counter()
+            try:
+                changed = self.reconvert()
+            except Exception as e:
+                self.error = "{}: {}".format(type(e).__name__, e)
+                self.failures = self.failures + 1 if stat == self.failed_stat else 1
+                self.failed_stat = stat
+                if isinstance(e, TRANSIENT_ERRORS):
+                    # the file may be in the middle of saving. try again later.
+                    self.retry_at = time.monotonic() + RETRY_SECONDS * 2 ** (self.failures - 1)
+                else:
+                    self.failures = RETRIES
+                return False
+
+            self.stat = stat
+            self.error = None
+            self.failed_stat = None
+            self.failures = 0
+            self.last_seconds = time.perf_counter() - start
+            if changed: self.converted_at = time.time()
+            return changed
+
+    def reconvert(self):
+        signatures = sheet_signatures(self.path)
+        candidates = [sheet_name for sheet_name, _ in converter.SHEETS
+                      if (sheet_name not in self.ws_data) or (not signatures) or (signatures.get(sheet_name) != self.signatures.get(sheet_name))]
+
+        ws_data = dict(self.ws_data)
+        sheet_hashes = dict(self.sheet_hashes)
+        changed_sheets = []
+        if candidates:
+            wb = px.load_workbook(self.path, read_only = True, data_only = True)
+            try:
+                for sheet_name in candidates:
+                    sheet_type = dict(converter.SHEETS)[sheet_name]
+                    grid = converter.load_grid(wb, sheet_name)
+                    sheet_hash = sheet_cache.grid_hash(grid, sheet_type)
+                    if sheet_hash != sheet_hashes.get(sheet_name):
+                        ws_data[sheet_name] = ex.extract(grid, sheet_type = sheet_type)
+                        sheet_hashes[sheet_name] = sheet_hash
+                        changed_sheets.append(sheet_name)
+            finally:
+                wb.close()
+
+        sections = dict(self.sections)
+        section_keys = dict(self.section_keys)
+        texts = dict(self.texts)
+        changed_sections = []
+        errors = []
+        for section, sheet_names, convert in converter.SECTIONS:
+            key = tuple(sheet_hashes[sheet_name] for sheet_name in sheet_names)
+            if key == section_keys.get(section): continue
+            try:
+                sections[section] = converter.convert_section(ws_data, section, convert)
+            except mapping.MappingError as e:
+                errors.append(str(e))
+                continue
+            section_keys[section] = key
+            texts[section] = changeset.dumps(sections[section])
+            changed_sections.append(section)
+        if errors: raise mapping.MappingError("; ".join(errors))
+
+        # replace the state only after all conversions succeeded.
+        self.signatures = signatures
+        self.ws_data = ws_data
+        self.sheet_hashes = sheet_hashes
+        self.sections = sections
+        self.section_keys = section_keys
+        self.texts = texts
+        self.last_changed_sheets = changed_sheets
+
+        if changed_sections and self.output_dir:
+            output_dir = os.path.join(self.output_dir, self.name)
+            os.makedirs(output_dir, exist_ok = True)
+            converter.write_outputs(output_dir, [sections[section] for section, _, _ in converter.SECTIONS], incremental = True)
+
+        return bool(changed_sections)
+
+    def text(self, section):
+        with self.lock:
+            return self.texts.get(section)
+
+    def device(self, section, name):
+        with self.lock:
+            for d in self.sections.get(section, []):
+                if d["Name"] == name: return d
+        return None
+
+    def status(self):
+        with self.lock:
+            return {
+                "path": self.path,
+                "converted_at": self.converted_at,
+                "last_seconds": self.last_seconds,
+                "last_changed_sheets": self.last_changed_sheets,
+                "sheet_hashes": self.sheet_hashes,
+                "error": self.error,
+            }
+
+class ConversionDaemon:
+    def __init__(self, paths, output_dir = None, interval = 1.0):
+        self.workbooks = {}
+        for path in paths:
+            workbook = WarmWorkbook(path, output_dir)
+            if workbook.name in self.workbooks:
+                raise ValueError("Workbook name {} is duplicated.".format(workbook.name))
+            self.workbooks[workbook.name] = workbook
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def refresh_all(self):
+        for workbook in self.workbooks.values():
+            error = workbook.error
+            if workbook.refresh():
+                print("{} is converted in {:.3f}s (changed sheets: {})".format(
+                    workbook.name, workbook.last_seconds, ", ".join(workbook.last_changed_sheets) or "none"), file = sys.stderr)
+            elif workbook.error and workbook.error != error:
+                print("{}: {}".format(workbook.name, workbook.error), file = sys.stderr)
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            self.refresh_all()
+
+    def handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = [unquote(p) for p in urlparse(self.path).path.split("/") if p]
+
+                if parts == ["status"]:
+                    return self.send_json(json.dumps({name: w.status() for name, w in daemon.workbooks.items()}, ensure_ascii = False, indent = 4))
+
+                workbook = daemon.workbooks.get(parts[0]) if parts else None
+                if workbook is None:
+                    return self.send_error(404, "Workbook is not found.")
+
+                # check the file again, so the response is never older than the file.
+                workbook.refresh()
+
+                if len(parts) == 2 and parts[1].endswith(".json"):
+                    text = workbook.text(parts[1][:-len(".json")])
+                    if text is None: return self.send_error(404, "Section is not found.")
+                    return self.send_json(text)
+                if len(parts) == 3:
+                    device = workbook.device(parts[1], parts[2])
+                    if device is None: return self.send_error(404, "Device is not found.")
+                    return self.send_json(changeset.dumps(device))
+                return self.send_error(404)
+
+            def send_json(self, text):
+                body = text.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve(self, host = "127.0.0.1", port = 8080):
+        self.refresh_all()
+        watcher = threading.Thread(target = self.watch, daemon = True)
+        watcher.start()
+
+        server = ThreadingHTTPServer((host, port), self.handler())
+        print("Serving {} on http://{}:{}/".format(", ".join(self.workbooks), host, server.server_port), file = sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stopped.set()
+            server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description = "Watch parameter sheets and serve converted JSON.")
+    parser.add_argument("parameter_sheets", nargs = "+", help = "parameter sheets (.xlsx) to watch")
+    parser.add_argument("--host", default = "127.0.0.1", help = "address to listen (default: 127.0.0.1)")
+    parser.add_argument("--port", type = int, default = 8080, help = "port to listen (default: 8080)")
+    parser.add_argument("--interval", type = float, default = 1.0, help = "seconds between checks of files (default: 1.0)")
+    parser.add_argument("--output-dir", help = "also write changed JSON files into <output dir>/<workbook name>/")
+    args = parser.parse_args()
+
+    ConversionDaemon(args.parameter_sheets, args.output_dir, args.interval).serve(args.host, args.port)
+
+if __name__ == '__main__':
+    main()
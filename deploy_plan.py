@@ -0,0 +1,111 @@
+﻿import argparse, sys
+import changeset
+
+# deployment plan of converted devices.
+#
+# a device depends on logical switches of ls.json it is connected to:
+#   ESG / DLR interfaces (Interfaces[].ConnectedTo), DLR HA interface (ConnectedTo) and DLR bridges (Bridge[].LogicalSwitch).
+# names not in ls.json are logical switches or port groups which already exist, and are listed as external.
+# devices are grouped into waves. a device depends only on devices of earlier waves,
+# so devices of the same wave can be deployed concurrently.
+#
+#   {"nodes": {"esg:ESG01": {"section": "esg", "name": "ESG01", "depends_on": ["ls:LS01"], "external": ["PG-MGMT"], "wave": 1}, ...},
+#    "waves": [["ls:LS01", ...], ["esg:ESG01", ...]]}
+
+SECTIONS = ["ls", "esg", "dlr"]
+
+def node_id(section, name):
+    return "{}:{}".format(section, name)
+
+# names of networks a device is connected to.
+def connected_names(section, device):
+    names = []
+    if section in ("esg", "dlr"):
+        names.extend(i["ConnectedTo"] for i in device["Interfaces"])
+    if section == "dlr":
+        names.append(device["ConnectedTo"])
+        names.extend(b["LogicalSwitch"] for b in device["Bridge"])
+
+    result = []
+    for name in names:
+        if name and name not in result: result.append(name)
+    return result
+
+def build_plan(ls_list, esg_list, dlr_list):
+    ls_names = set(ls["Name"] for ls in ls_list)
+
+    nodes = {}
+    for section, device_list in zip(SECTIONS, [ls_list, esg_list, dlr_list]):
+        for device in device_list:
+            node = nodes.setdefault(node_id(section, device["Name"]), {"section": section, "name": device["Name"], "depends_on": [], "external": []})
+            for name in connected_names(section, device):
+                if name in ls_names:
+                    if node_id("ls", name) not in node["depends_on"]: node["depends_on"].append(node_id("ls", name))
+                elif name not in node["external"]:
+                    node["external"].append(name)
+
+    return {"nodes": nodes, "waves": assign_waves(nodes)}
+
+# group nodes into waves by topological sort, one level at a time.
+def assign_waves(nodes):
+    remaining = {n: len(node["depends_on"]) for n, node in nodes.items()}
+    dependents = {}
+    for n, node in nodes.items():
+        for dep in node["depends_on"]:
+            dependents.setdefault(dep, []).append(n)
+
+    # devices in a wave keep the order of ls, esg and dlr files.
+    order = {n: i for i, n in enumerate(nodes)}
+
+    waves = []
+    ready = [n for n, count in remaining.items() if count == 0]
+    while ready:
+        ready.sort(key = order.get)
+        for n in ready:
+            nodes[n]["wave"] = len(waves)
+            del remaining[n]
+        waves.append(ready)
+
+        next_ready = []
+        for n in ready:
+            for dependent in dependents.get(n, []):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0: next_ready.append(dependent)
+        ready = next_ready
+
+    if remaining:
+        raise ValueError("Dependencies of {} are circular.".format(", ".join(sorted(remaining))))
+    return waves
+
+def write_plan(path, plan, incremental = False):
+    text = changeset.dumps(plan)
+    if incremental:
+        changeset.write_if_changed(path, text)
+    else:
+        with open(path, "w") as f: f.write(text)
+
+def print_plan(plan, file = sys.stdout):
+    for i, wave in enumerate(plan["waves"]):
+        print("wave {}: {}".format(i, ", ".join(wave)), file = file)
+
+# make plan from converted files.
+def main():
+    parser = argparse.ArgumentParser(description = "Make deployment plan from converted JSON files.")
+    parser.add_argument("confdir", nargs = "?", default = ".", help = "directory of ls, esg and dlr files (default: current directory)")
+    parser.add_argument("--output", help = "write plan to this file instead of printing waves")
+    args = parser.parse_args()
+
+    try:
+        sections = changeset.load_sections(args.confdir, SECTIONS)
+    except ValueError as e:
+        print(e, file = sys.stderr)
+        sys.exit(1)
+
+    plan = build_plan(*sections)
+    if args.output:
+        write_plan(args.output, plan)
+    else:
+        print_plan(plan)
+
+if __name__ == '__main__':
+    main()
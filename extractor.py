@@ -1,39 +1,122 @@
 ﻿import re, sys
 import openpyxl as px
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+import profiling
+
+MAX_COLUMN = 255  # columns beyond this are never scanned.
+
+# patterns of key and value cells, compiled once.
+NEWLINE_PATTERN = re.compile(r"^(.*)[\r\n](.*)")     # key written in two lines.
+MANDATORY_PATTERN = re.compile(r"\A(.+) \*\Z")        # mandatory key like 'User Name *'.
+REPEATABLE_PATTERN = re.compile(r"\A(.+) *#.*\Z")     # repeatable key like 'NSX Edge Appliance #1'.
+PLACEHOLDER_PATTERN = re.compile(r"\A\(.+\)\Z")       # placeholder value like '(optional)'.
+
+# values of marker cells.
+MARKERS = {"": "", "-": "", "■": True, "□": False}
+
+# most cells repeat a few strings, so normalized keys and values are cached per raw string.
+# only str is cached, because 1 and True are the same dict key.
+# caches are cleared when they grow beyond CACHE_SIZE, to bound memory of long-running processes.
+CACHE_SIZE = 65536
+key_cache = {}
+value_cache = {}
+
+# in-memory copy of worksheet values.
+# the worksheet is read only once by iter_rows() instead of ws.cell() for each probe.
+class Grid:
+    def __init__(self, ws, max_c = MAX_COLUMN):
+        self.title = ws.title
+        self.reads = 0  # number of value() calls, reported by profiling.
+        self.rows = []
+        # read-only worksheet stops at the <dimension> stored in the sheet, which may be stale.
+        # reset it, so rows below it are never dropped.
+        if isinstance(ws, ReadOnlyWorksheet): ws.reset_dimensions()
+        for row in ws.iter_rows(min_row = 1, min_col = 1, max_col = max_c, values_only = True):
+            # trim trailing empty cells to keep the grid compact.
+            n = len(row)
+            while n > 0 and row[n - 1] is None: n -= 1
+            self.rows.append(row[:n])
+
+    def value(self, r, c):
+        self.reads += 1
+        if r < 1 or r > len(self.rows): return None
+        row = self.rows[r - 1]
+        if c < 1 or c > len(row): return None
+        return row[c - 1]
+
+    # normalized values of columns in row r, in one sweep of the row.
+    def values(self, r, columns):
+        self.reads += len(columns)
+        row = self.rows[r - 1] if 1 <= r <= len(self.rows) else ()
+        n = len(row)
+        return [normalize_value(row[c - 1]) if 1 <= c <= n else "" for c in columns]
+
+def get_cell_value(r, c, ws):
+    if isinstance(ws, Grid): return ws.value(r, c)
+    return ws.cell(row = r, column = c).value
 
 def get_key(r, c, ws):
-    key = ws.cell(row = r, column = c).value
+    return normalize_key(get_cell_value(r, c, ws))
+
+def normalize_key(key):
     if (key is None) or (key == ""): return ""
-    
+    if not isinstance(key, str): return _normalize_key(key)
+
+    result = key_cache.get(key)
+    if result is None:
+        if len(key_cache) >= CACHE_SIZE: key_cache.clear()
+        result = key_cache[key] = _normalize_key(key)
+    return result
+
+def _normalize_key(key):
     # trim \r, \n
-    m = re.search(r"^(.*)[\r\n](.*)", key)
+    m = NEWLINE_PATTERN.search(key)
     if m: key = m.group(1) + m.group(2)
 
     # trim '*' from mandatory key like 'User Name *'.
-    m = re.match(r"\A(.+) \*\Z", key)
+    m = MANDATORY_PATTERN.match(key)
     if m: return m.group(1)
     return key
 
 def get_value(r, c, ws):
-    val = ws.cell(row = r, column = c).value
-    if (val is None) or (val == ""): return ""
-    if val == "-": return ""
-    if val == "■": return True
-    if val == "□": return False
-    if re.match(r"\A\(.+\)\Z", str(val)): return ""
-    return val
+    return normalize_value(get_cell_value(r, c, ws))
+
+def normalize_value(val):
+    if val is None: return ""
+    # numbers, booleans and dates are returned as they are.
+    if not isinstance(val, str): return val
+
+    try:
+        return value_cache[val]
+    except KeyError:
+        pass
+    if len(value_cache) >= CACHE_SIZE: value_cache.clear()
+    if val in MARKERS:
+        result = MARKERS[val]
+    elif PLACEHOLDER_PATTERN.match(val):
+        result = ""
+    else:
+        result = val
+    value_cache[val] = result
+    return result
+
+# split repeatable key like 'NSX Edge Appliance #1' into ['NSX Edge Appliance', True].
+def split_repeatable(key):
+    m = REPEATABLE_PATTERN.match(key)
+    if m: return [m.group(1).rstrip(), True]
+    return [key, False]
 
 # scan header line and get the list of target column numbers.
 def get_all_target(r, c, ws, sheet_type = "Normal"):
     target_list = []
 
-    max_c = 255  # prevent infinite loop.
+    max_c = MAX_COLUMN  # prevent infinite loop.
     c += 1
 
     while True:
         key = get_key(r, c, ws)
 
-        if key == "備考" or c >= 255: break
+        if key == "備考" or c >= max_c: break
 
         if sheet_type == "MultiColumn2":
             if target_list:
@@ -57,65 +140,114 @@ def get_all_target(r, c, ws, sheet_type = "Normal"):
 
     return target_list
 
-# get values for specified entry.
-def scan_v(r, c, ws, target_column):
-    result = {}
+# node of key schema.
+# repeatable is True for keys like 'NSX Edge Appliance #1' whose values are collected into a list.
+class KeyNode:
+    __slots__ = ("row", "key", "repeatable", "children")
+
+    def __init__(self, row, key, repeatable):
+        self.row = row
+        self.key = key
+        self.repeatable = repeatable
+        self.children = None
+
+# walk the key columns once and build the key schema shared by all target columns.
+def scan_keys(r, c, ws):
+    nodes = []
 
     while True:
         key = get_key(r, c, ws)
         if key:
             # trim '# and digit' from repeatable key like 'NSX Edge Appliance #1'.
-            m = re.match(r"\A(.+) *#.*\Z", key)
-            if m:
-                key = m.group(1).rstrip()
-
-                # make list for repeatable keys.
-                if key not in result: result[key] = []
-            else:
-                result[key] = get_value(r, target_column, ws)
-
-            # save current key to store nested keys.
-            old_key = key
+            key, repeatable = split_repeatable(key)
+            nodes.append(KeyNode(r, key, repeatable))
             r += 1
         else:
             # check nested key exists.
             key = get_key(r, c + 1, ws)
             if not key: break
 
-            r, nested_entries = scan_v(r, c + 1, ws, target_column)
-            if isinstance(result[old_key], list):
-                result[old_key].append(nested_entries)
+            # nested keys belong to the last key.
+            r, nodes[-1].children = scan_keys(r, c + 1, ws)
+
+    return [r, nodes]
+
+# get values of all target columns by one pass over the key schema.
+def fill_values(nodes, ws, target_columns):
+    results = [{} for _ in target_columns]
+
+    for node in nodes:
+        key = node.key
+        if node.repeatable:
+            # make list for repeatable keys.
+            for result in results:
+                if key not in result: result[key] = []
+        else:
+            if isinstance(ws, Grid):
+                values = ws.values(node.row, target_columns)
             else:
-                result[old_key] = nested_entries
+                values = [get_value(node.row, target_column, ws) for target_column in target_columns]
+            for result, value in zip(results, values):
+                result[key] = value
 
-    return [r, result]
+        if node.children is not None:
+            nested = fill_values(node.children, ws, target_columns)
+            for result, nested_entries in zip(results, nested):
+                if isinstance(result[key], list):
+                    result[key].append(nested_entries)
+                else:
+                    result[key] = nested_entries
+
+    return results
+
+# get values for specified entry.
+def scan_v(r, c, ws, target_column):
+    r, nodes = scan_keys(r, c, ws)
+    return [r, fill_values(nodes, ws, [target_column])[0]]
 
-def extract(ws, start_r = 4, start_c = 2, sheet_type = "Normal"):
+# use_grid = True reads the whole worksheet once into a Grid before scanning.
+def extract(ws, start_r = 4, start_c = 2, sheet_type = "Normal", use_grid = True):
     result_list = []
+    if use_grid and not isinstance(ws, Grid): ws = Grid(ws)
 
-    if sheet_type == "Normal":
-        for target_column in get_all_target(start_r, start_c, ws):
-            _, result = scan_v(start_r, start_c, ws, target_column)
-            result_list.append(result)
-    elif (sheet_type == "MultiColumn") or (sheet_type == "MultiColumn2"):
-        for target_columns in get_all_target(start_r, start_c, ws, sheet_type):
-            result = None
-            repeatable_keys = None
-            repeatable_items = None
-            for target_column in target_columns:
-                _, tmp = scan_v(start_r, start_c, ws, target_column)
-                if result is None:
-                    result = tmp
-                    repeatable_keys = get_repeatable_keys(tmp)
-                    repeatable_items = tmp
-                    for k in repeatable_keys:
-                        repeatable_items = repeatable_items[k]
-                else:
-                    for k in repeatable_keys:
-                        tmp = tmp[k]
-                    for item in tmp:
-                        repeatable_items.append(item)
-            result_list.append(result)
+    grid = ws if isinstance(ws, Grid) else None
+
+    # key columns are same for all target columns, so parse them only once.
+    with profiling.stage("scan_keys", ws.title, grid):
+        _, schema = scan_keys(start_r, start_c, ws)
+
+    with profiling.stage("get_all_target", ws.title, grid):
+        targets = get_all_target(start_r, start_c, ws, sheet_type)
+
+    with profiling.stage("fill_values", ws.title, grid):
+        if sheet_type == "Normal":
+            result_list = fill_values(schema, ws, targets)
+        elif (sheet_type == "MultiColumn") or (sheet_type == "MultiColumn2"):
+            result_list = merge_multi_column(schema, ws, targets)
+
+    return result_list
+
+# fill values of each group of columns and merge repeatable items of the group into its first column.
+def merge_multi_column(schema, ws, targets):
+    result_list = []
+
+    for target_columns in targets:
+        result = None
+        repeatable_keys = None
+        repeatable_items = None
+        for tmp in fill_values(schema, ws, target_columns):
+            if result is None:
+                result = tmp
+                repeatable_keys = get_repeatable_keys(tmp)
+                repeatable_items = tmp
+                for k in repeatable_keys:
+                    repeatable_items = repeatable_items[k]
+            else:
+                for k in repeatable_keys:
+                    tmp = tmp[k]
+                for item in tmp:
+                    repeatable_items.append(item)
+        result_list.append(result)
 
     return result_list
 
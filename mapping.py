@@ -0,0 +1,412 @@
+﻿import contextlib, re
+import models
+
+# declarative mapping from extracted sheet data to records.
+#
+# a mapping lists fields of a record. each field maps a label path of extracted data to an attribute:
+#   Field("appliance_size", ("Configure deployment", "Appliance Size"), appliance_size)
+# "*" in a label path maps the rest of the path over the items of a repeatable key.
+# Nested and Items fields build a record or a list of records from the data at the label path.
+#
+# each mapping is compiled once, when the tables are defined, into a function of straight-line lookups
+# like record.name = d["Name and description"]["Name"], which is applied to every device.
+# when a lookup fails, the device is mapped again field by field to find the labels not found.
+# labels not found are collected through all devices instead of stopping at the first KeyError,
+# and reported together by MappingError.
+
+LOOKUP_ERRORS = (KeyError, IndexError, TypeError)
+
+OMIT = object()  # transform returns OMIT to leave the attribute unset.
+
+class MappingError(Exception):
+    pass
+
+# accessor function of label path, used to find which label is not found.
+def compile_path(path):
+    if "*" in path:
+        i = path.index("*")
+        head, tail = compile_path(path[:i]), compile_path(path[i + 1:])
+        return lambda d: [tail(item) for item in head(d)]
+
+    def get(d):
+        for k in path: d = d[k]
+        return d
+    return get
+
+# python expression of label path, like d['Name and description']['Name'].
+def path_expression(var, path, depth = 0):
+    if "*" in path:
+        i = path.index("*")
+        item = "item{}".format(depth)
+        return "[{} for {} in {}]".format(path_expression(item, path[i + 1:], depth + 1), item, path_expression(var, path[:i], depth))
+    return var + "".join("[{!r}]".format(step) for step in path)
+
+# label path as written in sheet, like 'Configure deployment > NSX Edge Appliance #n > Host'.
+def label_path(path):
+    labels = []
+    for step in path:
+        if step == "*":
+            labels[-1] += " #n"
+        elif isinstance(step, int):
+            labels[-1] += " #{}".format(step + 1)
+        else:
+            labels.append(step)
+    return " > ".join(labels)
+
+# labels and devices not found, in the order they are found.
+class MissingLabels:
+    def __init__(self):
+        self.messages = {}
+
+    def add(self, sheet, path):
+        self.messages.setdefault("'{}' is not found in {}".format(label_path(path), sheet), None)
+
+    def not_found(self, sheet, name):
+        self.messages.setdefault("{} is not found in {}".format(name, sheet), None)
+
+    def check(self):
+        if self.messages: raise MappingError("; ".join(self.messages))
+
+# collect missing labels and raise MappingError at the end, unless the caller collects them.
+@contextlib.contextmanager
+def collecting(missing = None):
+    if missing is not None:
+        yield missing
+        return
+    missing = MissingLabels()
+    yield missing
+    missing.check()
+
+# field of record. path is a tuple of labels, or a list of them to pass several values to transform.
+class Field:
+    def __init__(self, attr, path, transform = None):
+        self.attr = attr
+        self.paths = path if isinstance(path, list) else [path]
+        self.getters = [compile_path(p) for p in self.paths]
+        self.transform = transform
+
+    def apply(self, record, d, missing, sheet, prefix):
+        values = []
+        for path, get in zip(self.paths, self.getters):
+            try:
+                values.append(get(d))
+            except LOOKUP_ERRORS:
+                missing.add(sheet, prefix + path)
+                return
+        value = self.convert(values, missing, sheet, prefix)
+        if value is not OMIT: setattr(record, self.attr, value)
+
+    def convert(self, values, missing, sheet, prefix):
+        if self.transform is None: return values[0]
+        return self.transform(*values)
+
+    # lines of compiled function. objects used by the lines are added to names.
+    def source(self, n, names):
+        values = ", ".join(path_expression("d", path) for path in self.paths)
+        if self.transform is None: return ["record.{} = {}".format(self.attr, values)]
+        names["transform{}".format(n)] = self.transform
+        return ["value = transform{}({})".format(n, values), "if value is not OMIT: record.{} = value".format(self.attr)]
+
+# record built from the data at path.
+class Nested(Field):
+    def __init__(self, attr, path, mapping):
+        super().__init__(attr, path)
+        self.mapping = mapping
+
+    def convert(self, values, missing, sheet, prefix):
+        return self.mapping.apply(values[0], missing, sheet = sheet, prefix = prefix + self.paths[0])
+
+    def source(self, n, names):
+        names["mapping{}".format(n)] = self.mapping.compiled
+        return ["record.{} = mapping{}({})".format(self.attr, n, path_expression("d", self.paths[0]))]
+
+# list of records built from the items of repeatable key at path.
+class Items(Nested):
+    def convert(self, values, missing, sheet, prefix):
+        prefix = prefix + self.paths[0] + ("*",)
+        records = [self.mapping.apply(item, missing, sheet = sheet, prefix = prefix) for item in values[0]]
+        return [r for r in records if r is not None]
+
+    def source(self, n, names):
+        names["mapping{}".format(n)] = self.mapping.compiled
+        items = "[mapping{}(item) for item in {}]".format(n, path_expression("d", self.paths[0]))
+        if self.mapping.skip_empty: items = "[r for r in {} if r is not None]".format(items)
+        return ["record.{} = {}".format(self.attr, items)]
+
+# fields of record_type. with record_type None, fields are set to the record given to apply().
+# items whose skip_empty label is empty are skipped.
+class Mapping:
+    def __init__(self, record_type, fields, sheet = None, skip_empty = None):
+        self.record_type = record_type
+        self.fields = fields
+        self.sheet = sheet
+        self.skip_empty = skip_empty
+        self.skip_getter = compile_path(skip_empty) if skip_empty else None
+        self.compiled = self.compile()
+
+    def compile(self):
+        names = {"OMIT": OMIT, "record_type": self.record_type}
+        lines = ["def apply(d, record = None):"]
+        if self.skip_empty: lines.append("    if not {}: return None".format(path_expression("d", self.skip_empty)))
+        if self.record_type is not None: lines.append("    if record is None: record = record_type()")
+        for n, field in enumerate(self.fields):
+            lines.extend("    " + line for line in field.source(n, names))
+        lines.append("    return record")
+        exec("\n".join(lines), names)
+        return names["apply"]
+
+    def apply(self, d, missing, record = None, sheet = None, prefix = ()):
+        try:
+            return self.compiled(d, record)
+        except LOOKUP_ERRORS:
+            pass
+
+        # map field by field to collect labels not found.
+        sheet = sheet or self.sheet
+        if self.skip_getter is not None:
+            try:
+                if not self.skip_getter(d): return None
+            except LOOKUP_ERRORS:
+                missing.add(sheet, prefix + self.skip_empty)
+                return None
+
+        if record is None: record = self.record_type()
+        for field in self.fields:
+            field.apply(record, d, missing, sheet, prefix)
+        return record
+
+    # records of all entries, skipping empty ones.
+    def apply_all(self, entries, missing):
+        for d in entries:
+            record = self.apply(d, missing)
+            if record is not None: yield record
+
+# transforms.
+
+def replication_mode(mode):
+    return mode.upper() + "_MODE"
+
+def appliance_size(size):
+    return re.sub(r"[- ]", "", size).lower()
+
+def universal(install_type):
+    return install_type == "Universal Logical (Distributed) Router"
+
+def folder(name):
+    return name or "vm"
+
+# the second appliance is for HA.
+def hosts(names):
+    return names[:2] if len(names) > 1 else names[0]
+
+def ha_datastore(datastores):
+    return datastores[1] if len(datastores) > 1 else OMIT
+
+def syslog_servers(server1, server2):
+    return [s for s in (server1, server2) if s] or OMIT
+
+# mapping tables.
+
+LOGICAL_SWITCH = Mapping(models.LogicalSwitch, [
+    Field("name", ("Name",)),
+    Field("description", ("Description",)),
+    Field("transport_zone", ("Transport Zone",)),
+    Field("replication_mode", ("Replication mode",), replication_mode),
+    Field("enable_ip_discovery", ("Enable IP Discovery",)),
+    Field("enable_mac_learning", ("Enable MAC Learning",)),
+], sheet = "Logical Switches", skip_empty = ("Name",))
+
+# appliance settings shared by ESG and DLR.
+def appliance_fields(label):
+    appliances = ("Configure deployment", label)
+    return [
+        Field("cluster", appliances + (0, "Cluster/Resource Pool")),
+        Field("datastore", appliances + (0, "Datastore")),
+        Field("host", appliances + ("*", "Host"), hosts),
+        Field("folder", appliances + (0, "Folder"), folder),
+        Field("ha_datastore", appliances + ("*", "Datastore"), ha_datastore),
+    ]
+
+DEFAULT_GATEWAY_SETTINGS = [
+    Field("configure_default_gateway", ("Default gateway settings", "Configure Default Gateway")),
+    Field("gateway_vnic", ("Default gateway settings", "vNIC")),
+    Field("gateway_ip", ("Default gateway settings", "Gateway IP")),
+    Field("gateway_mtu", ("Default gateway settings", "MTU")),
+    Field("gateway_admin_distance", ("Default gateway settings", "Admin Distance")),
+]
+
+ESG_DEPLOY = Mapping(models.Esg, [
+    Field("name", ("Name and description", "Name")),
+    Field("hostname", ("Name and description", "Hostname")),
+    Field("enable_high_availability", ("Name and description", "Enable High Availability")),
+    Field("password", ("Settings", "Password")),
+    Field("enable_ssh_access", ("Settings", "Enable SSH access")),
+    Field("enable_fips_mode", ("Settings", "Enable FIPS mode")),
+    Field("enable_auto_rule_generation", ("Settings", "Enable auto rule generation")),
+    Field("edge_control_level_logging", ("Settings", "Edge Control Level Logging")),
+    Field("datacenter", ("Configure deployment", "Datacenter")),
+    Field("appliance_size", ("Configure deployment", "Appliance Size"), appliance_size),
+] + appliance_fields("NSX Edge Appliance") + DEFAULT_GATEWAY_SETTINGS + [
+    Field("configure_firewall_default_policy", ("Firewall and HA", "Configure Firewall default policy")),
+    Field("default_traffic_policy", ("Firewall and HA", "Default Traffic Policy")),
+    Field("default_firewall_logging", ("Firewall and HA", "Logging")),
+    Field("ha_vnic", ("Firewall and HA", "vNIC")),
+    Field("ha_declare_dead_time", ("Firewall and HA", "Declare Dead Time")),
+    Field("ha_management_ips", ("Firewall and HA", "Management IPs")),
+], sheet = "NSX Edge Deploy")
+
+DLR_DEPLOY = Mapping(models.Dlr, [
+    Field("universal", ("Name and description", "Install Type"), universal),
+    Field("local_egress", ("Name and description", "Local Egress")),
+    Field("name", ("Name and description", "Name")),
+    Field("hostname", ("Name and description", "Hostname")),
+    Field("enable_high_availability", ("Name and description", "Enable High Availability")),
+    Field("password", ("Settings", "Password")),
+    Field("enable_ssh_access", ("Settings", "Enable SSH access")),
+    Field("enable_fips_mode", ("Settings", "Enable FIPS mode")),
+    Field("edge_control_level_logging", ("Settings", "Edge Control Level Logging")),
+    Field("datacenter", ("Configure deployment", "Datacenter")),
+] + appliance_fields("DLR Appliance") + [
+    Field("connected_to", ("Configure interfaces", "HA Interface Configuration", "Connected To")),
+    Field("primary_ip_address", ("Configure interfaces", "HA Interface Configuration", "Primary IP Address")),
+    Field("subnet_prefix_length", ("Configure interfaces", "HA Interface Configuration", "Subnet Prefix Length")),
+] + DEFAULT_GATEWAY_SETTINGS, sheet = "DLR Deploy")
+
+SYSLOG = Mapping(models.Syslog, [
+    Field("syslog_servers", [("Syslog Server 1",), ("Syslog Server 2",)], syslog_servers),
+    Field("protocol", ("Protocol",)),
+])
+
+SYSLOG_PATH = ("Configuration", "Details", "Syslog Servers")
+
+ESG_SETTINGS = Mapping(None, [
+    Nested("syslog", SYSLOG_PATH, SYSLOG),
+    Items("interfaces", ("Interfaces", "vNIC"), Mapping(models.EsgInterface, [
+        Field("name", ("Name",)),
+        Field("type", ("Type",)),
+        Field("connected_to", ("Connected To",)),
+        Field("primary_ip_address", ("Configure Subnets", "PrimaryIP Address")),
+        Field("secondary_ip_address", ("Configure Subnets", "SecondaryIP Addresses")),
+        Field("subnet_prefix_length", ("Configure Subnets", "Subnet Prefix Length")),
+        Field("mtu", ("Configure Subnets", "MTU")),
+        Field("enable_proxy_arp", ("Configure Subnets", "Options", "Enable Proxy ARP")),
+        Field("send_icmp_redirect", ("Configure Subnets", "Options", "Send ICMP Redirect")),
+        Field("reverse_path_filter", ("Configure Subnets", "Options", "Reverse Path Filter")),
+    ])),
+], sheet = "NSX Edge Settings")
+
+DLR_SETTINGS = Mapping(None, [
+    Nested("syslog", SYSLOG_PATH, SYSLOG),
+    Items("interfaces", ("Interfaces", "vNIC"), Mapping(models.DlrInterface, [
+        Field("name", ("Name",)),
+        Field("type", ("Type",)),
+        Field("connected_to", ("Connected To",)),
+        Field("primary_ip_address", ("Configure Subnets", "PrimaryIP Address")),
+        Field("subnet_prefix_length", ("Configure Subnets", "Subnet Prefix Length")),
+        Field("mtu", ("Configure Subnets", "MTU")),
+    ], skip_empty = ("Name",))),
+], sheet = "DLR Settings")
+
+# global configuration, static routes and route redistribution are the same for ESG and DLR.
+# default gateway of DLR has no admin distance.
+def global_configuration(default_gateway_fields):
+    return Mapping(models.GlobalConfiguration, [
+        Field("router_id", ("Dynamic Routing Configuration", "Router ID")),
+        Field("ecmp", ("ECMP",)),
+        Nested("default_gateway", ("Default Gateway",), Mapping(models.DefaultGateway, default_gateway_fields)),
+    ])
+
+DEFAULT_GATEWAY = [
+    Field("vnic", ("vNIC",)),
+    Field("gateway_ip", ("Gateway IP",)),
+    Field("mtu", ("MTU",)),
+]
+
+STATIC_ROUTE = Mapping(models.StaticRoute, [
+    Field("network", ("Network",)),
+    Field("next_hop", ("Next Hop",)),
+])
+
+ROUTE_REDISTRIBUTION = Mapping(models.RouteRedistribution, [
+    Items("ip_prefixes", ("IP Prefixes", "IP Prefix"), Mapping(models.IPPrefix, [
+        Field("name", ("Name",)),
+        Field("ip_network", ("IP/Network",)),
+    ])),
+    Items("route_redistribution_table", ("Route Redistribution Table", "Redistribution Criteria"), Mapping(models.RedistributionCriteria, [
+        Field("prefix_name", ("Prefix Name",)),
+        Field("learner_protocol", ("Learner Protocol",)),
+        Nested("allow_learning_from", ("Allow Learning from",), Mapping(models.AllowLearningFrom, [
+            Field("ospf", ("OSPF",)),
+            Field("bgp", ("BGP",)),
+            Field("static_routes", ("Static Routes",)),
+            Field("connected", ("Connected",)),
+        ])),
+        Field("action", ("Action",)),
+    ])),
+])
+
+def routing_fields(global_configuration_mapping, ospf_mapping, bgp_mapping):
+    return [
+        Nested("global_configuration", ("Global Configuration",), global_configuration_mapping),
+        Items("static_route", ("Static routes", "route"), STATIC_ROUTE),
+        Nested("ospf", ("OSPF",), ospf_mapping),
+        Nested("bgp", ("BGP",), bgp_mapping),
+        Nested("route_redistribution", ("Route Redistribution",), ROUTE_REDISTRIBUTION),
+    ]
+
+NEIGHBOR_TIMERS = [
+    Field("weight", ("Weight",)),
+    Field("keep_alive_time", ("Keep Alive Time",)),
+    Field("hold_down_time", ("Hold Down Time",)),
+    Field("password", ("Password",)),
+]
+
+ESG_ROUTING = Mapping(None, routing_fields(
+    global_configuration(DEFAULT_GATEWAY + [Field("admin_distance", ("Admin Distance",))]),
+    Mapping(models.EsgOspf, [
+        Field("status", ("Status",)),
+        Field("graceful_restart", ("Graceful Restart",)),
+        Field("default_originate", ("Default Originate",)),
+    ]),
+    Mapping(models.Bgp, [
+        Field("status", ("Status",)),
+        Field("local_as", ("Local AS",)),
+        Field("graceful_restart", ("Graceful Restart",)),
+        Field("default_originate", ("Default Originate",)),
+        Items("neighbors", ("Neighbors", "Neighbor"), Mapping(models.EsgBgpNeighbor, [
+            Field("ip_address", ("IP Address",)),
+            Field("remote_as", ("Remote AS",)),
+            Field("remove_private_as", ("Remove Private AS",)),
+        ] + NEIGHBOR_TIMERS)),
+    ]),
+), sheet = "NSX Edge Routing")
+
+DLR_ROUTING = Mapping(None, routing_fields(
+    global_configuration(DEFAULT_GATEWAY),
+    Mapping(models.DlrOspf, [
+        Field("status", ("Status",)),
+        Field("protocol_address", ("Protocol Address",)),
+        Field("forwarding_address", ("Forwarding Address",)),
+        Field("graceful_restart", ("Graceful Restart",)),
+    ]),
+    Mapping(models.Bgp, [
+        Field("status", ("Status",)),
+        Field("graceful_restart", ("Graceful Restart",)),
+        Field("local_as", ("Local AS",)),
+        Items("neighbors", ("Neighbors", "Neighbor"), Mapping(models.DlrBgpNeighbor, [
+            Field("interface", ("Interface",)),
+            Field("ip_address", ("IP Address",)),
+            Field("forwarding_address", ("Forwarding Address",)),
+            Field("protocol_address", ("Protocol Address",)),
+            Field("remote_as", ("Remote AS",)),
+        ] + NEIGHBOR_TIMERS)),
+    ]),
+), sheet = "DLR Routing")
+
+DLR_BRIDGING = Mapping(None, [
+    Items("bridge", ("Bridges", "Bridge"), Mapping(models.Bridge, [
+        Field("name", ("Name",)),
+        Field("logical_switch", ("Logical Switch",)),
+        Field("distributed_port_group", ("Distributed Port Group",)),
+    ], skip_empty = ("Name",))),
+], sheet = "DLR Bridding")
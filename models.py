@@ -0,0 +1,276 @@
+﻿# typed records of converted devices.
+#
+# each record class lists its attributes and JSON keys in FIELDS, and stores values in __slots__ instead of dict.
+# attributes left unset are omitted from JSON, like optional keys of the original dicts (e.g. HADatastore).
+# to_json() is the only serializer, and changeset.dumps() uses it for records.
+# records can also be read like dicts by JSON key, e.g. esg["Name"], for existing callers.
+
+# __slots__ are made from FIELDS when a record class is defined.
+class RecordType(type):
+    def __new__(mcs, name, bases, namespace):
+        fields = namespace.get("FIELDS", ())
+        namespace["__slots__"] = tuple(attr for attr, _ in fields)
+        namespace["KEYS"] = {key: attr for attr, key in fields}
+        return super().__new__(mcs, name, bases, namespace)
+
+class Record(metaclass = RecordType):
+    FIELDS = ()
+
+    def __init__(self, **values):
+        for attr, value in values.items():
+            setattr(self, attr, value)
+
+    def to_json(self):
+        d = {}
+        for attr, key in self.FIELDS:
+            try:
+                d[key] = getattr(self, attr)
+            except AttributeError:
+                continue
+        return d
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.KEYS[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.KEYS and hasattr(self, self.KEYS[key])
+
+    def __eq__(self, other):
+        if type(self) is not type(other): return NotImplemented
+        return self.to_json() == other.to_json()
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join("{}={!r}".format(k, v) for k, v in self.to_json().items()))
+
+# json.dumps(default = to_json) serializes nested records and lists of them.
+def to_json(obj):
+    if isinstance(obj, Record): return obj.to_json()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+class LogicalSwitch(Record):
+    FIELDS = (
+        ("name", "Name"),
+        # the key is misspelled, but it is kept for compatibility with existing ls.json.
+        ("description", "Dscription"),
+        ("transport_zone", "TransportZone"),
+        ("replication_mode", "ReplicationMode"),
+        ("enable_ip_discovery", "EnableIpDiscovery"),
+        ("enable_mac_learning", "EnableMacLearning"),
+    )
+
+class Syslog(Record):
+    FIELDS = (
+        ("syslog_servers", "SyslogServers"),
+        ("protocol", "Protocol"),
+    )
+
+class EsgInterface(Record):
+    FIELDS = (
+        ("name", "Name"),
+        ("type", "Type"),
+        ("connected_to", "ConnectedTo"),
+        ("primary_ip_address", "PrimaryIPAddress"),
+        ("secondary_ip_address", "SecondaryIPAddress"),
+        ("subnet_prefix_length", "SubnetPrefixLength"),
+        ("mtu", "MTU"),
+        ("enable_proxy_arp", "EnableProxyARP"),
+        ("send_icmp_redirect", "SendICMPRedirect"),
+        ("reverse_path_filter", "ReversePathFilter"),
+    )
+
+class DlrInterface(Record):
+    FIELDS = (
+        ("name", "Name"),
+        ("type", "Type"),
+        ("connected_to", "ConnectedTo"),
+        ("primary_ip_address", "PrimaryIPAddress"),
+        ("subnet_prefix_length", "SubnetPrefixLength"),
+        ("mtu", "MTU"),
+    )
+
+# admin_distance is set only for ESG.
+class DefaultGateway(Record):
+    FIELDS = (
+        ("vnic", "vNIC"),
+        ("gateway_ip", "GatewayIP"),
+        ("mtu", "MTU"),
+        ("admin_distance", "AdminDistance"),
+    )
+
+class GlobalConfiguration(Record):
+    FIELDS = (
+        ("router_id", "RouterId"),
+        ("ecmp", "ECMP"),
+        ("default_gateway", "DefaultGateway"),
+    )
+
+class StaticRoute(Record):
+    FIELDS = (
+        ("network", "Network"),
+        ("next_hop", "NextHop"),
+    )
+
+class EsgOspf(Record):
+    FIELDS = (
+        ("status", "Status"),
+        ("graceful_restart", "GracefulRestart"),
+        ("default_originate", "DefaultOriginate"),
+    )
+
+class DlrOspf(Record):
+    FIELDS = (
+        ("status", "Status"),
+        ("protocol_address", "ProtocolAddress"),
+        ("forwarding_address", "ForwardingAddress"),
+        ("graceful_restart", "GracefulRestart"),
+    )
+
+# default_originate is set only for ESG.
+class Bgp(Record):
+    FIELDS = (
+        ("status", "Status"),
+        ("local_as", "LocalAS"),
+        ("graceful_restart", "GracefulRestart"),
+        ("default_originate", "DefaultOriginate"),
+        ("neighbors", "Neighbors"),
+    )
+
+class EsgBgpNeighbor(Record):
+    FIELDS = (
+        ("ip_address", "IPAddress"),
+        ("remote_as", "RemoteAS"),
+        ("remove_private_as", "RemovePrivateAS"),
+        ("weight", "Weight"),
+        ("keep_alive_time", "KeepAliveTime"),
+        ("hold_down_time", "HoldDownTime"),
+        ("password", "Password"),
+    )
+
+class DlrBgpNeighbor(Record):
+    FIELDS = (
+        ("interface", "Interface"),
+        ("ip_address", "IPAddress"),
+        ("forwarding_address", "ForwardingAddress"),
+        ("protocol_address", "ProtocolAddress"),
+        ("remote_as", "RemoteAS"),
+        ("weight", "Weight"),
+        ("keep_alive_time", "KeepAliveTime"),
+        ("hold_down_time", "HoldDownTime"),
+        ("password", "Password"),
+    )
+
+class IPPrefix(Record):
+    FIELDS = (
+        ("name", "Name"),
+        ("ip_network", "IP/Network"),
+    )
+
+class AllowLearningFrom(Record):
+    FIELDS = (
+        ("ospf", "OSPF"),
+        ("bgp", "BGP"),
+        ("static_routes", "StaticRoutes"),
+        ("connected", "Connected"),
+    )
+
+class RedistributionCriteria(Record):
+    FIELDS = (
+        ("prefix_name", "PrefixName"),
+        ("learner_protocol", "LearnerProtocol"),
+        ("allow_learning_from", "AllowLearningFrom"),
+        ("action", "Action"),
+    )
+
+class RouteRedistribution(Record):
+    FIELDS = (
+        ("ip_prefixes", "IPPrefixes"),
+        ("route_redistribution_table", "RouteRedistributionTable"),
+    )
+
+class Bridge(Record):
+    FIELDS = (
+        ("name", "Name"),
+        ("logical_switch", "LogicalSwitch"),
+        ("distributed_port_group", "DistributedPortGroup"),
+    )
+
+# fields of routing sheet shared by ESG and DLR.
+ROUTING_FIELDS = (
+    ("global_configuration", "GlobalConfiguration"),
+    ("static_route", "StaticRoute"),
+    ("ospf", "Ospf"),
+    ("bgp", "Bgp"),
+    ("route_redistribution", "RouteRedistribution"),
+)
+
+class Esg(Record):
+    FIELDS = (
+        ("name", "Name"),
+        ("hostname", "Hostname"),
+        ("enable_high_availability", "EnableHighAvailability"),
+        ("password", "Password"),
+        ("enable_ssh_access", "EnableSSHaccess"),
+        ("enable_fips_mode", "EnableFIPSmode"),
+        ("enable_auto_rule_generation", "EnableAutoRuleGeneration"),
+        ("edge_control_level_logging", "EdgeControlLevelLogging"),
+        ("datacenter", "Datacenter"),
+        ("appliance_size", "ApplianceSize"),
+        ("cluster", "Cluster"),
+        ("datastore", "Datastore"),
+        ("host", "Host"),
+        ("folder", "Folder"),
+        ("ha_datastore", "HADatastore"),
+        ("configure_default_gateway", "ConfigureDefaultGateway"),
+        ("gateway_vnic", "GatewayvNIC"),
+        ("gateway_ip", "GatewayIP"),
+        ("gateway_mtu", "GatewayMTU"),
+        ("gateway_admin_distance", "GatewayAdminDistance"),
+        ("configure_firewall_default_policy", "ConfigureFirewallDefaultPolicy"),
+        ("default_traffic_policy", "DefaultTrafficPolicy"),
+        ("default_firewall_logging", "DefaultFirewallLogging"),
+        ("ha_vnic", "HAvNIC"),
+        ("ha_declare_dead_time", "HADeclareDeadTime"),
+        ("ha_management_ips", "HAManagementIPs"),
+        ("syslog", "Syslog"),
+        ("interfaces", "Interfaces"),
+    ) + ROUTING_FIELDS
+
+class Dlr(Record):
+    FIELDS = (
+        ("universal", "Universal"),
+        ("local_egress", "LocalEgress"),
+        ("name", "Name"),
+        ("hostname", "Hostname"),
+        ("enable_high_availability", "EnableHighAvailability"),
+        ("password", "Password"),
+        ("enable_ssh_access", "EnableSSHaccess"),
+        ("enable_fips_mode", "EnableFIPSmode"),
+        ("edge_control_level_logging", "EdgeControlLevelLogging"),
+        ("datacenter", "Datacenter"),
+        ("cluster", "Cluster"),
+        ("datastore", "Datastore"),
+        ("host", "Host"),
+        ("folder", "Folder"),
+        ("ha_datastore", "HADatastore"),
+        ("connected_to", "ConnectedTo"),
+        ("primary_ip_address", "PrimaryIPAddress"),
+        ("subnet_prefix_length", "SubnetPrefixLength"),
+        ("configure_default_gateway", "ConfigureDefaultGateway"),
+        ("gateway_vnic", "GatewayvNIC"),
+        ("gateway_ip", "GatewayIP"),
+        ("gateway_mtu", "GatewayMTU"),
+        ("gateway_admin_distance", "GatewayAdminDistance"),
+        ("syslog", "Syslog"),
+        ("interfaces", "Interfaces"),
+    ) + ROUTING_FIELDS + (
+        ("bridge", "Bridge"),
+    )
@@ -0,0 +1,175 @@
+﻿import argparse, json, sys
+import changeset
+import models
+import parameter_sheet_to_json as converter
+import sheet_cache
+
+# semantic diff of two parameter sheet revisions.
+#
+# both workbooks are converted, and devices are aligned by name.
+# only devices whose JSON differs are compared in depth, and items of lists are aligned by identity instead of position,
+# so an inserted vNIC or BGP neighbor is reported as one added item.
+# with cache, sections whose sheets have the same content in both workbooks are skipped without comparing devices.
+#
+#   {"old": "v1.xlsx", "new": "v2.xlsx",
+#    "sections": {"esg": {"added": ["ESG03"], "removed": [], "changed": {"ESG01": [
+#        {"change": "changed", "path": "Interfaces[vnic1].PrimaryIPAddress", "old": "10.0.0.1", "new": "10.0.0.2"},
+#        {"change": "added", "path": "Bgp.Neighbors[172.16.0.3]", "new": {...}}]}}, ...}}
+
+# identity keys of items, by the key of list.
+IDENTITY = {
+    "Interfaces": ["Name"],
+    "Neighbors": ["IPAddress"],
+    "StaticRoute": ["Network"],
+    "IPPrefixes": ["Name"],
+    "RouteRedistributionTable": ["PrefixName", "LearnerProtocol"],
+    "Bridge": ["Name"],
+}
+
+MISSING = object()
+
+# records into dicts and lists.
+def plain(value):
+    if isinstance(value, models.Record): value = value.to_json()
+    if isinstance(value, dict): return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list): return [plain(v) for v in value]
+    return value
+
+# label of item in path. items without identity are labeled by position, and duplicated labels get '#n'.
+def item_labels(items, keys):
+    labels = []
+    used = {}
+    for i, item in enumerate(items):
+        values = [str(item.get(k, "")) for k in keys] if isinstance(item, dict) else []
+        label = " ".join(values) if any(values) else "#{}".format(i + 1)
+        used[label] = used.get(label, 0) + 1
+        if used[label] > 1: label = "{}#{}".format(label, used[label])
+        labels.append(label)
+    return labels
+
+# returns [(label, old item, new item)] in the order of old items, then added items.
+def align(old_items, new_items, keys):
+    old_index = dict(zip(item_labels(old_items, keys), old_items))
+    new_index = dict(zip(item_labels(new_items, keys), new_items))
+    pairs = [(label, item, new_index.get(label, MISSING)) for label, item in old_index.items()]
+    pairs.extend((label, MISSING, item) for label, item in new_index.items() if label not in old_index)
+    return pairs
+
+def same(old, new):
+    return type(old) is type(new) and old == new
+
+def diff_values(old, new, path, changes, list_key = None):
+    if same(old, new): return
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        keys = list(old) + [k for k in new if k not in old]
+        for k in keys:
+            diff_values(old.get(k, MISSING), new.get(k, MISSING), "{}.{}".format(path, k) if path else k, changes, k)
+    elif isinstance(old, list) and isinstance(new, list) and list_key in IDENTITY:
+        for label, old_item, new_item in align(old, new, IDENTITY[list_key]):
+            diff_values(old_item, new_item, "{}[{}]".format(path, label), changes)
+    elif old is MISSING:
+        changes.append({"change": "added", "path": path, "new": new})
+    elif new is MISSING:
+        changes.append({"change": "removed", "path": path, "old": old})
+    else:
+        changes.append({"change": "changed", "path": path, "old": old, "new": new})
+
+# compare devices of a section. changeset.compare() finds changed names, and only they are compared in depth.
+def diff_section(old_list, new_list):
+    changes = changeset.compare(old_list, new_list)
+    result = {"added": changes["added"], "removed": changes["removed"], "changed": {}}
+    if not changes["changed"]: return result
+
+    old_groups = changeset.group_by_name(old_list)
+    new_groups = changeset.group_by_name(new_list)
+    for name in changes["changed"]:
+        device_changes = []
+        old_devices, new_devices = plain(old_groups[name]), plain(new_groups[name])
+        if len(old_devices) == 1 and len(new_devices) == 1:
+            diff_values(old_devices[0], new_devices[0], "", device_changes)
+        else:
+            # devices of duplicated name are compared by position.
+            for label, old_device, new_device in align(old_devices, new_devices, []):
+                diff_values(old_device, new_device, label, device_changes)
+        result["changed"][name] = device_changes
+    return result
+
+# returns [converted sections, {sheet name: sheet hash}]. sheet hashes are None without cache.
+def load_converted(parameter_sheet, jobs = 1, cache = None):
+    if cache is None:
+        ws_data, _ = converter.load_sheets(parameter_sheet, jobs)
+        return [converter.convert_all(ws_data), None]
+
+    converted = converter.convert_cached(parameter_sheet, cache, jobs)
+    return [converted, cache.get("workbook", sheet_cache.file_hash(parameter_sheet))]
+
+def diff_workbooks(old_sheet, new_sheet, jobs = 1, cache = None):
+    old_sections, old_hashes = load_converted(old_sheet, jobs, cache)
+    new_sections, new_hashes = load_converted(new_sheet, jobs, cache)
+
+    sections = {}
+    for (section, sheet_names, _), old_list, new_list in zip(converter.SECTIONS, old_sections, new_sections):
+        if old_hashes and new_hashes and all(old_hashes.get(s) == new_hashes.get(s) for s in sheet_names):
+            sections[section] = {"added": [], "removed": [], "changed": {}}
+        else:
+            sections[section] = diff_section(old_list, new_list)
+
+    return {"old": old_sheet, "new": new_sheet, "sections": sections}
+
+def has_differences(result):
+    return any(s["added"] or s["removed"] or s["changed"] for s in result["sections"].values())
+
+def format_value(value):
+    if isinstance(value, str): return value
+    return json.dumps(value, ensure_ascii = False, sort_keys = True)
+
+def print_diff(result, file = sys.stdout):
+    for section, s in result["sections"].items():
+        for name in s["added"]:
+            print("+ {} {}".format(section, name), file = file)
+        for name in s["removed"]:
+            print("- {} {}".format(section, name), file = file)
+        for name, changes in s["changed"].items():
+            print("~ {} {}".format(section, name), file = file)
+            for c in changes:
+                if c["change"] == "added":
+                    print("    + {}: {}".format(c["path"], format_value(c["new"])), file = file)
+                elif c["change"] == "removed":
+                    print("    - {}: {}".format(c["path"], format_value(c["old"])), file = file)
+                else:
+                    print("    ~ {}: {} -> {}".format(c["path"], format_value(c["old"]), format_value(c["new"])), file = file)
+
+# exit status is 0 without differences, 1 with differences and 2 on errors, like diff command.
+def main():
+    parser = argparse.ArgumentParser(description = "Compare devices converted from two parameter sheets.")
+    parser.add_argument("old_sheet", help = "parameter sheet (.xlsx) before change")
+    parser.add_argument("new_sheet", help = "parameter sheet (.xlsx) after change")
+    parser.add_argument("-j", "--jobs", type = int, default = 1, help = "number of worker processes to extract sheets (default: 1)")
+    parser.add_argument("--cache-dir", help = "directory of cache shared with parameter_sheet_to_json.py. sections of unchanged sheets are not compared")
+    parser.add_argument("--cache-size", type = int, default = 512, help = "maximum size of cache in MB (default: 512)")
+    parser.add_argument("--format", choices = ["text", "json"], default = "text", help = "output format (default: text)")
+    parser.add_argument("--output", help = "write differences to this file instead of stdout")
+    args = parser.parse_args()
+
+    # any failure, including writing the output, exits with 2, so it is never read as differences.
+    try:
+        cache = converter.open_cache(args.cache_dir, args.cache_size) if args.cache_dir else None
+        result = diff_workbooks(args.old_sheet, args.new_sheet, args.jobs, cache)
+
+        if args.output:
+            with open(args.output, "w", encoding = "utf-8") as f:
+                if args.format == "json": f.write(changeset.dumps(result))
+                else: print_diff(result, f)
+        elif args.format == "json":
+            print(changeset.dumps(result))
+        else:
+            print_diff(result)
+    except Exception as e:
+        print("{}: {}".format(type(e).__name__, e), file = sys.stderr)
+        sys.exit(2)
+
+    sys.exit(1 if has_differences(result) else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,135 @@
-﻿import json, sys, re
+﻿import argparse, cProfile, glob, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+import changeset
+import columnar
+import deploy_plan
 import extractor as ex
+import mapping
+import models
+import profiling
+import sheet_cache
+import validation
 import openpyxl as px
 
+# sheet name and sheet type of each sheet in parameter sheet.
+SHEETS = [
+    ("Logical Switches", "MultiColumn2"),
+    ("NSX Edge Deploy", "Normal"),
+    ("NSX Edge Settings", "Normal"),
+    ("NSX Edge Routing", "Normal"),
+    ("DLR Deploy", "Normal"),
+    ("DLR Settings", "MultiColumn"),
+    ("DLR Routing", "Normal"),
+    ("DLR Bridding", "MultiColumn"),
+]
+
+# extract one sheet in worker process and return [extracted data, sheet hash, profiling records].
+# sheet hash is None without cache, and profiling records are empty without profile.
+# profile_memory is passed from the main process, so '--profile-no-memory' also applies to workers.
+def extract_sheet(parameter_sheet, sheet_name, sheet_type, cache = None, profile = False, profile_memory = True):
+    if profile:
+        profiling.reset()
+        profiling.enable(memory = profile_memory)
+
+    with profiling.stage("load_workbook", sheet_name):
+        wb = px.load_workbook(parameter_sheet, read_only = True, data_only = True)
+    try:
+        grid = load_grid(wb, sheet_name)
+        data, sheet_hash = extract_grid(grid, sheet_name, sheet_type, cache)
+    finally:
+        wb.close()
+
+    return [data, sheet_hash, list(profiling.records) if profile else []]
+
+def load_grid(wb, sheet_name):
+    with profiling.stage("load", sheet_name):
+        grid = ex.Grid(wb[sheet_name])
+        profiling.add("cells", sum(len(row) for row in grid.rows))
+    return grid
+
+def extract_grid(grid, sheet_name, sheet_type, cache = None):
+    with profiling.stage("extract", sheet_name):
+        if cache is None:
+            return [ex.extract(grid, sheet_type = sheet_type), None]
+
+        with profiling.stage("hash", sheet_name):
+            sheet_hash = sheet_cache.grid_hash(grid, sheet_type)
+            data = cache.get("sheet", sheet_hash)
+        if data is None:
+            data = ex.extract(grid, sheet_type = sheet_type)
+            cache.put("sheet", sheet_hash, data)
+        else:
+            profiling.add("cache_hits", 1)
+        return [data, sheet_hash]
+
+# open workbook in read-only mode and extract the sheets one by one.
+# each sheet is read into memory only while it is extracted.
+# with jobs > 1, sheets are extracted in worker processes and merged in the order of SHEETS.
+# returns [{sheet name: extracted data}, {sheet name: sheet hash}].
+def load_sheets(parameter_sheet, jobs = 1, cache = None):
+    ws_data = {}
+    sheet_hashes = {}
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers = jobs) as executor:
+            futures = [executor.submit(extract_sheet, parameter_sheet, sheet_name, sheet_type, cache, profiling.enabled, profiling.trace_memory) for sheet_name, sheet_type in SHEETS]
+            for (sheet_name, _), future in zip(SHEETS, futures):
+                ws_data[sheet_name], sheet_hashes[sheet_name], records = future.result()
+                profiling.merge(records)
+        return [ws_data, sheet_hashes]
+
+    with profiling.stage("load_workbook"):
+        wb = px.load_workbook(parameter_sheet, read_only = True, data_only = True)
+    try:
+        for sheet_name, sheet_type in SHEETS:
+            grid = load_grid(wb, sheet_name)
+            ws_data[sheet_name], sheet_hashes[sheet_name] = extract_grid(grid, sheet_name, sheet_type, cache)
+            del grid
+    finally:
+        wb.close()
+
+    return [ws_data, sheet_hashes]
+
 def convert_ls(ws_data):
-    ls_list = []
-
-    for d in ws_data[0]["Logical Switch"]:
-        ls = {}
-        name = d["Name"]
-        if not name: continue
-        ls["Name"] = name
-        ls["Dscription"] = d["Description"]
-        ls["TransportZone"] = d["Transport Zone"]
-        ls["ReplicationMode"] = d["Replication mode"].upper() + "_MODE"
-        ls["EnableIpDiscovery"] = d["Enable IP Discovery"]
-        ls["EnableMacLearning"] = d["Enable MAC Learning"]
-        ls_list.append(ls)
- 
-    return ls_list
+    return list(iter_ls(ws_data))
+
+# labels are mapped to records by the tables of mapping.py.
+# missing labels of all devices are collected, and MappingError is raised after the last device.
+def iter_ls(ws_data, missing = None):
+    with mapping.collecting(missing) as missing:
+        yield from mapping.LOGICAL_SWITCH.apply_all(ws_data[0]["Logical Switch"], missing)
+
+# index extracted data by name_key once, instead of scanning the list for every device.
+# duplicated names and names not found in the sheet are reported here at once.
+# when name_key itself is not found, it is added to missing labels and None is returned instead of index.
+def index_data(ws_data, name_key, names = None, sheet_name = "sheet", missing = None):
+    index = {}
+    duplicated = []
+    for e in ws_data:
+        try:
+            name = e[name_key]
+        except mapping.LOOKUP_ERRORS:
+            with mapping.collecting(missing) as missing:
+                missing.add(sheet_name, (name_key,))
+            return None
+        if name in index:
+            if name not in duplicated: duplicated.append(name)
+            continue
+        index[name] = e
+
+    for name in duplicated:
+        print("Data matches to {} is duplicated in {}.".format(name, sheet_name), file = sys.stderr)
+    if names is not None:
+        for name in names:
+            if name is not None and name not in index:
+                print("Data matches to {} is not found in {}.".format(name, sheet_name), file = sys.stderr)
+
+    return index
 
 def select_data(ws_data, name, name_key = "Name"):
+    # data indexed by index_data() is looked up directly.
+    if isinstance(ws_data, dict): return ws_data.get(name, [])
+
     d = list(filter(lambda e: e[name_key] == name, ws_data))
     if len(d) < 1:
         print("Data matches to {} is not found.".format(name), file = sys.stderr)
@@ -28,371 +138,483 @@ def select_data(ws_data, name, name_key = "Name"):
         print("Data matches to {} is duplicated.".format(name), file = sys.stderr)
     return d[0]
 
+# names of devices in deploy sheet. devices without name label are None, and the label is added to missing labels.
+def deploy_names(deploy, sheet_name, missing):
+    names = []
+    for d in deploy:
+        try:
+            names.append(d["Name and description"]["Name"])
+        except mapping.LOOKUP_ERRORS:
+            missing.add(sheet_name, ("Name and description", "Name"))
+            names.append(None)
+    return names
+
 def convert_esg(ws_data):
-    esg_list = []
-
-    for d in ws_data:
-        esg = {}
-        
-        p = d["Name and description"]
-        esg["Name"] = p["Name"]
-        esg["Hostname"] = p["Hostname"]
-        esg["EnableHighAvailability"] = p["Enable High Availability"]
-
-        p = d["Settings"]
-        esg["Password"] = p["Password"]
-        esg["EnableSSHaccess"] = p["Enable SSH access"]
-        esg["EnableFIPSmode"] = p["Enable FIPS mode"]
-        esg["EnableAutoRuleGeneration"] = p["Enable auto rule generation"]
-        esg["EdgeControlLevelLogging"] = p["Edge Control Level Logging"]
-
-        p = d["Configure deployment"]
-        esg["Datacenter"] = p["Datacenter"]
-        esg["ApplianceSize"] = re.sub(r"[- ]", "", p["Appliance Size"]).lower()
-        appliances = p["NSX Edge Appliance"]
-        esg["Cluster"] = appliances[0]["Cluster/Resource Pool"]
-        esg["Datastore"] = appliances[0]["Datastore"]
-        esg["Host"] = appliances[0]["Host"]
-        esg["Folder"] = appliances[0]["Folder"]
-        if not esg["Folder"]: esg["Folder"] = "vm"
-        if len(appliances) > 1:
-            esg["Host"] = [esg["Host"], appliances[1]["Host"]]
-            esg["HADatastore"] = appliances[1]["Datastore"]
-        
-        p = d["Default gateway settings"]
-        esg["ConfigureDefaultGateway"] = p["Configure Default Gateway"]
-        esg["GatewayvNIC"] = p["vNIC"]
-        esg["GatewayIP"] = p["Gateway IP"]
-        esg["GatewayMTU"] = p["MTU"]
-        esg["GatewayAdminDistance"] = p["Admin Distance"]
-
-        p = d["Firewall and HA"]
-        esg["ConfigureFirewallDefaultPolicy"] = p["Configure Firewall default policy"]
-        esg["DefaultTrafficPolicy"] = p["Default Traffic Policy"]
-        esg["DefaultFirewallLogging"] = p["Logging"]
-        esg["HAvNIC"] = p["vNIC"]
-        esg["HADeclareDeadTime"] = p["Declare Dead Time"]
-        esg["HAManagementIPs"] = p["Management IPs"]
-
-        esg_list.append(esg)
-
-    return esg_list
-
-
-def convert_esg_settings(ws_data, esg_name):
-    d = select_data(ws_data, esg_name, "Edge Name")
-
-    interfaces = []
-    nics = d["Interfaces"]["vNIC"]
-    for n in nics:
-        interface = {}
-        interface["Name"] = n["Name"]
-        interface["Type"] = n["Type"]
-        interface["ConnectedTo"] = n["Connected To"]
-        config = n["Configure Subnets"]
-        interface["PrimaryIPAddress"] = config["PrimaryIP Address"]
-        interface["SecondaryIPAddress"] = config["SecondaryIP Addresses"]
-        interface["SubnetPrefixLength"] = config["Subnet Prefix Length"]
-        interface["MTU"] = config["MTU"]
-        option = config["Options"]
-        interface["EnableProxyARP"] = option["Enable Proxy ARP"]
-        interface["SendICMPRedirect"] = option["Send ICMP Redirect"]
-        interface["ReversePathFilter"] = option["Reverse Path Filter"]
-        interfaces.append(interface)
-
-    syslog = {}
-    p = d["Configuration"]
-    s = p["Details"]["Syslog Servers"]
-    if s["Syslog Server 1"] or s["Syslog Server 2"]:
-        syslog["SyslogServers"] = []
-        if s["Syslog Server 1"]: syslog["SyslogServers"].append(s["Syslog Server 1"])
-        if s["Syslog Server 2"]: syslog["SyslogServers"].append(s["Syslog Server 2"])
-    syslog["Protocol"] = s["Protocol"]
-        
-    return [syslog, interfaces]
-
-def convert_esg_routing(ws_data, esg_name):
-    d = select_data(ws_data, esg_name, "Edge Name")
-    
-    global_configuration = {}
-    p = d["Global Configuration"]
-    global_configuration["RouterId"] = p["Dynamic Routing Configuration"]["Router ID"]
-    global_configuration["ECMP"] = p["ECMP"]
-    default_gateway = {}
-    default_gateway["vNIC"] = p["Default Gateway"]["vNIC"]
-    default_gateway["GatewayIP"] = p["Default Gateway"]["Gateway IP"]
-    default_gateway["MTU"] = p["Default Gateway"]["MTU"]
-    default_gateway["AdminDistance"] = p["Default Gateway"]["Admin Distance"]
-    global_configuration["DefaultGateway"] = default_gateway
-
-    static_routes = []
-    for r in d["Static routes"]["route"]:
-        static_route = {}
-        static_route["Network"] = r["Network"]
-        static_route["NextHop"] = r["Next Hop"]
-        static_routes.append(static_route)
-
-    ospf = {}
-    p = d["OSPF"]
-    ospf["Status"] = p["Status"]
-    ospf["GracefulRestart"] = p["Graceful Restart"]
-    ospf["DefaultOriginate"] = p["Default Originate"]
-
-    bgp = {}
-    p = d["BGP"]
-    bgp["Status"] = p["Status"]
-    bgp["LocalAS"] = p["Local AS"]
-    bgp["GracefulRestart"] = p["Graceful Restart"]
-    bgp["DefaultOriginate"] = p["Default Originate"]
-    neighbors = []
-    for n in p["Neighbors"]["Neighbor"]:
-        neighbor = {}
-        neighbor["IPAddress"] = n["IP Address"]
-        neighbor["RemoteAS"] = n["Remote AS"]
-        neighbor["RemovePrivateAS"] = n["Remove Private AS"]
-        neighbor["Weight"] = n["Weight"]
-        neighbor["KeepAliveTime"] = n["Keep Alive Time"]
-        neighbor["HoldDownTime"] = n["Hold Down Time"]
-        neighbor["Password"] = n["Password"]
-        neighbors.append(neighbor)
-    bgp["Neighbors"] = neighbors
-
-    route_redistribution = {}
-    p = d["Route Redistribution"]
-    
-    ip_prefixes = []
-    for pf in p["IP Prefixes"]["IP Prefix"]:
-        ip_prefix = {}
-        ip_prefix["Name"] = pf["Name"]
-        ip_prefix["IP/Network"] = pf["IP/Network"]
-        ip_prefixes.append(ip_prefix)
-    route_redistribution["IPPrefixes"] = ip_prefixes
-    
-    route_redistribution_table = []
-    for r in p["Route Redistribution Table"]["Redistribution Criteria"]:
-        redistribution_criteria = {}
-        redistribution_criteria["PrefixName"] = r["Prefix Name"]
-        redistribution_criteria["LearnerProtocol"] = r["Learner Protocol"]
-        redistribution_criteria["AllowLearningFrom"] = {}
-        redistribution_criteria["AllowLearningFrom"]["OSPF"] = r["Allow Learning from"]["OSPF"]
-        redistribution_criteria["AllowLearningFrom"]["BGP"] = r["Allow Learning from"]["BGP"]
-        redistribution_criteria["AllowLearningFrom"]["StaticRoutes"] = r["Allow Learning from"]["Static Routes"]
-        redistribution_criteria["AllowLearningFrom"]["Connected"] = r["Allow Learning from"]["Connected"]
-        redistribution_criteria["Action"] = r["Action"]
-        route_redistribution_table.append(redistribution_criteria)
-    route_redistribution["RouteRedistributionTable"] = route_redistribution_table
-    
-    return [global_configuration, static_routes, ospf, bgp, route_redistribution]
+    return list(iter_esg(ws_data))
 
-def convert_dlr(ws_data):
-    dlr_list = []
-    
-    for d in ws_data:
-        dlr = {}
-
-        p = d["Name and description"]
-        dlr["Universal"] = ( p["Install Type"] == "Universal Logical (Distributed) Router" )
-        dlr["LocalEgress"] = p["Local Egress"]
-        dlr["Name"] = p["Name"]
-        dlr["Hostname"] = p["Hostname"]
-        dlr["Hostname"] = p["Hostname"]
-        dlr["EnableHighAvailability"] = p["Enable High Availability"]
-
-        p = d["Settings"]
-        dlr["Password"] = p["Password"]
-        dlr["EnableSSHaccess"] = p["Enable SSH access"]
-        dlr["EnableFIPSmode"] = p["Enable FIPS mode"]
-        dlr["EdgeControlLevelLogging"] = p["Edge Control Level Logging"]
-
-        p = d["Configure deployment"]
-        dlr["Datacenter"] = p["Datacenter"] 
-        appliances = p["DLR Appliance"]
-        dlr["Cluster"] = appliances[0]["Cluster/Resource Pool"]
-        dlr["Datastore"] = appliances[0]["Datastore"]
-        dlr["Host"] = appliances[0]["Host"]
-        dlr["Folder"] = appliances[0]["Folder"]
-        if not esg["Folder"]: esg["Folder"] = "vm"
-        if len(appliances) > 1:
-            dlr["Host"] = [dlr["Host"], appliances[1]["Host"]]
-            dlr["HADatastore"] = appliances[1]["Datastore"]
-
-        p = d["Configure interfaces"]
-        haconfig = p["HA Interface Configuration"]
-        dlr["ConnectedTo"] = haconfig["Connected To"]
-        dlr["PrimaryIPAddress"] = haconfig["Primary IP Address"]
-        dlr["SubnetPrefixLength"] = haconfig["Subnet Prefix Length"]
-
-        p = d["Default gateway settings"]
-        dlr["ConfigureDefaultGateway"] = p["Configure Default Gateway"]
-        dlr["GatewayvNIC"] = p["vNIC"]
-        dlr["GatewayIP"] = p["Gateway IP"]
-        dlr["GatewayMTU"] = p["MTU"]
-        dlr["GatewayAdminDistance"] = p["Admin Distance"]
-        
-        dlr_list.append(dlr)
-
-    return dlr_list
-
-def convert_dlr_settings(ws_data, dlr_name):
-    d = select_data(ws_data, dlr_name, "DLR Name")
-    
-    interfaces = []
-    nics = d["Interfaces"]["vNIC"]
-    for n in nics:
-        interface = {}
-        name = n["Name"]
-        if not name: continue
-        interface["Name"] = name
-        interface["Type"] = n["Type"]
-        interface["ConnectedTo"] = n["Connected To"]
-        config = n["Configure Subnets"]
-        interface["PrimaryIPAddress"] = config["PrimaryIP Address"]
-        interface["SubnetPrefixLength"] = config["Subnet Prefix Length"]
-        interface["MTU"] = config["MTU"]
-        interfaces.append(interface)
-
-    syslog = {}
-    p = d["Configuration"]
-    s = p["Details"]["Syslog Servers"]
-    if s["Syslog Server 1"] or s["Syslog Server 2"]:
-        syslog["SyslogServers"] = []
-        if s["Syslog Server 1"]: syslog["SyslogServers"].append(s["Syslog Server 1"])
-        if s["Syslog Server 2"]: syslog["SyslogServers"].append(s["Syslog Server 2"])
-    syslog["Protocol"] = s["Protocol"]
-
-    return [syslog, interfaces]
-
-def convert_dlr_routing(ws_data, dlr_name):
-    d = select_data(ws_data, dlr_name, "DLR Name")
-    
-    global_configuration = {}
-    p = d["Global Configuration"]
-    global_configuration["RouterId"] = p["Dynamic Routing Configuration"]["Router ID"]
-    global_configuration["ECMP"] = p["ECMP"]
-    default_gateway = {}
-    default_gateway["vNIC"] = p["Default Gateway"]["vNIC"]
-    default_gateway["GatewayIP"] = p["Default Gateway"]["Gateway IP"]
-    default_gateway["MTU"] = p["Default Gateway"]["MTU"]
-    global_configuration["DefaultGateway"] = default_gateway
-
-    static_routes = []
-    for r in d["Static routes"]["route"]:
-        static_route = {}
-        static_route["Network"] = r["Network"]
-        static_route["NextHop"] = r["Next Hop"]
-        static_routes.append(static_route)
-
-    ospf = {}
-    p = d["OSPF"]
-    ospf["Status"] = p["Status"]
-    ospf["ProtocolAddress"] = p["Protocol Address"]
-    ospf["ForwardingAddress"] = p["Forwarding Address"]
-    ospf["GracefulRestart"] = p["Graceful Restart"]
-    
-    bgp = {}
-    p = d["BGP"]
-    bgp["Status"] = p["Status"]
-    bgp["GracefulRestart"] = p["Graceful Restart"]
-    bgp["LocalAS"] = p["Local AS"]
-    neighbors = []
-    for n in p["Neighbors"]["Neighbor"]:
-        neighbor = {}
-        neighbor["Interface"] = n["Interface"]
-        neighbor["IPAddress"] = n["IP Address"]
-        neighbor["ForwardingAddress"] = n["Forwarding Address"]
-        neighbor["ProtocolAddress"] = n["Protocol Address"]
-        neighbor["RemoteAS"] = n["Remote AS"]
-        neighbor["Weight"] = n["Weight"]
-        neighbor["KeepAliveTime"] = n["Keep Alive Time"]
-        neighbor["HoldDownTime"] = n["Hold Down Time"]
-        neighbor["Password"] = n["Password"]
-        neighbors.append(neighbor)
-    bgp["Neighbors"] = neighbors
-    
-    route_redistribution = {}
-    p = d["Route Redistribution"]
-    
-    ip_prefixes = []
-    for pf in p["IP Prefixes"]["IP Prefix"]:
-        ip_prefix = {}
-        ip_prefix["Name"] = pf["Name"]
-        ip_prefix["IP/Network"] = pf["IP/Network"]
-        ip_prefixes.append(ip_prefix)
-    route_redistribution["IPPrefixes"] = ip_prefixes
-    
-    route_redistribution_table = []
-    for r in p["Route Redistribution Table"]["Redistribution Criteria"]:
-        redistribution_criteria = {}
-        redistribution_criteria["PrefixName"] = r["Prefix Name"]
-        redistribution_criteria["LearnerProtocol"] = r["Learner Protocol"]
-        redistribution_criteria["AllowLearningFrom"] = {}
-        redistribution_criteria["AllowLearningFrom"]["OSPF"] = r["Allow Learning from"]["OSPF"]
-        redistribution_criteria["AllowLearningFrom"]["BGP"] = r["Allow Learning from"]["BGP"]
-        redistribution_criteria["AllowLearningFrom"]["StaticRoutes"] = r["Allow Learning from"]["Static Routes"]
-        redistribution_criteria["AllowLearningFrom"]["Connected"] = r["Allow Learning from"]["Connected"]
-        redistribution_criteria["Action"] = r["Action"]
-        route_redistribution_table.append(redistribution_criteria)
-    route_redistribution["RouteRedistributionTable"] = route_redistribution_table
-    
-    return [global_configuration, static_routes, ospf, bgp, route_redistribution]
-
-def convert_dlr_bridge(ws_data, dlr_name):
-    d = select_data(ws_data, dlr_name, "DLR Name")
-
-    bridges = []
-    for b in d["Bridges"]["Bridge"]:
-        bridge = {}
-        name = b["Name"]
-        if not name: continue
-        bridge["Name"] = name
-        bridge["LogicalSwitch"] = b["Logical Switch"]
-        bridge["DistributedPortGroup"] = b["Distributed Port Group"]
-        bridges.append(bridge)
-
-    return bridges
-
-
-
-if len(sys.argv) < 2:
-    print("usage {} <paramenter_sheet.xlsx> [<output directory>]".format(sys.argv[0]))
-    exit()
-
-output_dir = "."
-if len(sys.argv) > 2:
-    output_dir = sys.argv[2]
-
-parameter_sheet = sys.argv[1]
-
-wb = px.load_workbook(parameter_sheet, data_only = True)
-ws_data_ls = ex.extract(wb['Logical Switches'], sheet_type = "MultiColumn2")
-ws_data_edge1 = ex.extract(wb['NSX Edge Deploy'])
-ws_data_edge2 = ex.extract(wb['NSX Edge Settings'])
-ws_data_edge3 = ex.extract(wb['NSX Edge Routing'])
-ws_data_dlr1 = ex.extract(wb['DLR Deploy'])
-ws_data_dlr2 = ex.extract(wb['DLR Settings'], sheet_type = "MultiColumn")
-ws_data_dlr3 = ex.extract(wb['DLR Routing'])
-ws_data_dlr4 = ex.extract(wb['DLR Bridding'], sheet_type = "MultiColumn")
-wb.close()
-
-# LS settings
-ls_list = convert_ls(ws_data_ls)
-
-# ESG settings
-esg_list = convert_esg(ws_data_edge1)
-for esg in esg_list:
-    esg_name = esg["Name"]
-    esg["Syslog"], esg["Interfaces"] = convert_esg_settings(ws_data_edge2, esg_name)
-    esg["GlobalConfiguration"], esg["StaticRoute"], esg["Ospf"], esg["Bgp"], esg["RouteRedistribution"] = convert_esg_routing(ws_data_edge3, esg_name)
-
-# DLR settings
-dlr_list = convert_dlr(ws_data_dlr1)
-for dlr in dlr_list:
-    dlr_name = dlr["Name"]
-    dlr["Syslog"], dlr["Interfaces"] = convert_dlr_settings(ws_data_dlr2, dlr_name)
-    dlr["GlobalConfiguration"], dlr["StaticRoute"], dlr["Ospf"], dlr["Bgp"], dlr["RouteRedistribution"] = convert_dlr_routing(ws_data_dlr3, dlr_name)
-    dlr["Bridge"] = convert_dlr_bridge(ws_data_dlr4, dlr_name)
-
-with open((output_dir + "/ls.json"), "w")  as f: f.write(json.dumps(ls_list,  ensure_ascii=False, indent=4, sort_keys=True, separators=(',', ': ')))
-with open((output_dir + "/esg.json"), "w") as f: f.write(json.dumps(esg_list, ensure_ascii=False, indent=4, sort_keys=True, separators=(',', ': ')))
-with open((output_dir + "/dlr.json"), "w") as f: f.write(json.dumps(dlr_list, ensure_ascii=False, indent=4, sort_keys=True, separators=(',', ': ')))
+def iter_esg(ws_data, missing = None):
+    with mapping.collecting(missing) as missing:
+        yield from mapping.ESG_DEPLOY.apply_all(ws_data, missing)
 
+def convert_dlr(ws_data):
+    return list(iter_dlr(ws_data))
+
+def iter_dlr(ws_data, missing = None):
+    with mapping.collecting(missing) as missing:
+        yield from mapping.DLR_DEPLOY.apply_all(ws_data, missing)
+
+# set fields of sheet_mapping from the data of device in the sheet.
+# ws_data is None when the sheet has no name_key, which is already reported.
+def complete_device(device, ws_data, sheet_mapping, name_key, missing):
+    if ws_data is None: return
+    d = select_data(ws_data, device.name, name_key)
+    if d:
+        sheet_mapping.apply(d, missing, device)
+    else:
+        missing.not_found(sheet_mapping.sheet, device.name)
+
+# yield ESGs one by one with settings and routing.
+def iter_esgs(ws_data):
+    with mapping.collecting() as missing:
+        deploy = ws_data['NSX Edge Deploy']
+        names = deploy_names(deploy, 'NSX Edge Deploy', missing)
+        settings = index_data(ws_data['NSX Edge Settings'], "Edge Name", names, 'NSX Edge Settings', missing)
+        routing = index_data(ws_data['NSX Edge Routing'], "Edge Name", names, 'NSX Edge Routing', missing)
+
+        for esg in iter_esg(deploy, missing):
+            yield complete_esg(esg, settings, routing, missing)
+
+def complete_esg(esg, settings, routing, missing = None):
+    with mapping.collecting(missing) as missing:
+        complete_device(esg, settings, mapping.ESG_SETTINGS, "Edge Name", missing)
+        complete_device(esg, routing, mapping.ESG_ROUTING, "Edge Name", missing)
+    return esg
+
+# yield DLRs one by one with settings, routing and bridges.
+def iter_dlrs(ws_data):
+    with mapping.collecting() as missing:
+        deploy = ws_data['DLR Deploy']
+        names = deploy_names(deploy, 'DLR Deploy', missing)
+        settings = index_data(ws_data['DLR Settings'], "DLR Name", names, 'DLR Settings', missing)
+        routing = index_data(ws_data['DLR Routing'], "DLR Name", names, 'DLR Routing', missing)
+        bridging = index_data(ws_data['DLR Bridding'], "DLR Name", names, 'DLR Bridding', missing)
+
+        for dlr in iter_dlr(deploy, missing):
+            yield complete_dlr(dlr, settings, routing, bridging, missing)
+
+def complete_dlr(dlr, settings, routing, bridging, missing = None):
+    with mapping.collecting(missing) as missing:
+        complete_device(dlr, settings, mapping.DLR_SETTINGS, "DLR Name", missing)
+        complete_device(dlr, routing, mapping.DLR_ROUTING, "DLR Name", missing)
+        complete_device(dlr, bridging, mapping.DLR_BRIDGING, "DLR Name", missing)
+    return dlr
+
+def convert_esgs(ws_data):
+    return list(iter_esgs(ws_data))
+
+def convert_dlrs(ws_data):
+    return list(iter_dlrs(ws_data))
+
+# output sections, sheets used by each section and the generator of its devices.
+SECTIONS = [
+    ("ls", ['Logical Switches'], lambda ws_data: iter_ls(ws_data['Logical Switches'])),
+    ("esg", ['NSX Edge Deploy', 'NSX Edge Settings', 'NSX Edge Routing'], iter_esgs),
+    ("dlr", ['DLR Deploy', 'DLR Settings', 'DLR Routing', 'DLR Bridding'], iter_dlrs),
+]
+
+# output formats and file extensions.
+FORMATS = {"json": ".json", "jsonl": ".jsonl"}
+
+# output directory to stream jsonl to stdout.
+STDOUT = "-"
+
+# parameter sheet converted lazily on access.
+#
+#   with ParameterSheet("parameter_sheet.xlsx") as sheet:
+#       sheet.logical_switches, sheet.esgs, sheet.dlrs  -> converted lists
+#       sheet.esg("name"), sheet.dlr("name")            -> one converted device
+#
+# a sheet is extracted only when a section needs it, and extracted sheets and converted devices are memoized.
+# sheet["sheet name"] returns extracted data, so the object can be passed to iter_esgs() / iter_dlrs().
+class ParameterSheet:
+    def __init__(self, path, cache = None):
+        self.path = path
+        self.cache = cache
+        self.sheet_hashes = {}
+        self._wb = None
+        self._ws_data = {}
+        self._indexes = {}
+        self._sections = {}
+        self._devices = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+
+    def __getitem__(self, sheet_name):
+        if sheet_name not in self._ws_data:
+            if self._wb is None:
+                with profiling.stage("load_workbook"):
+                    self._wb = px.load_workbook(self.path, read_only = True, data_only = True)
+            grid = load_grid(self._wb, sheet_name)
+            self._ws_data[sheet_name], self.sheet_hashes[sheet_name] = extract_grid(grid, sheet_name, dict(SHEETS)[sheet_name], self.cache)
+        return self._ws_data[sheet_name]
+
+    # extract all sheets at once, in worker processes with jobs > 1.
+    def load(self, jobs = 1):
+        ws_data, sheet_hashes = load_sheets(self.path, jobs, self.cache)
+        self._ws_data.update(ws_data)
+        self.sheet_hashes.update(sheet_hashes)
+        return self
+
+    # sheets without name_key are not memoized, so the missing label is reported on every call.
+    def index(self, sheet_name, name_key, missing = None):
+        if sheet_name not in self._indexes:
+            index = index_data(self[sheet_name], name_key, sheet_name = sheet_name, missing = missing)
+            if index is None: return None
+            self._indexes[sheet_name] = index
+        return self._indexes[sheet_name]
+
+    # deploy data of the named device. the first one is used when the name is duplicated.
+    def deploy_data(self, sheet_name, name, missing):
+        deploy = self[sheet_name]
+        return [d for d, n in zip(deploy, deploy_names(deploy, sheet_name, missing)) if n == name][:1]
+
+    # devices converted before by device() are reused, and the others are memoized for device(),
+    # so both return the same objects in any order.
+    def section(self, section):
+        if section not in self._sections:
+            convert = {s: convert for s, _, convert in SECTIONS}[section]
+            devices = convert_section(self, section, convert)
+            names = set()
+            for i, d in enumerate(devices):
+                # device() returns the first device of duplicated names.
+                if d["Name"] in names: continue
+                names.add(d["Name"])
+                devices[i] = self._devices.setdefault((section, d["Name"]), d)
+            self._sections[section] = devices
+        return self._sections[section]
+
+    @property
+    def logical_switches(self):
+        return self.section("ls")
+
+    @property
+    def esgs(self):
+        return self.section("esg")
+
+    @property
+    def dlrs(self):
+        return self.section("dlr")
+
+    def logical_switch(self, name):
+        return self.device("ls", name)
+
+    def esg(self, name):
+        return self.device("esg", name)
+
+    def dlr(self, name):
+        return self.device("dlr", name)
+
+    # convert only the named device unless the whole section is already converted.
+    def device(self, section, name):
+        key = (section, name)
+        if key in self._devices: return self._devices[key]
+
+        if section in self._sections or section == "ls":
+            found = [d for d in self.section(section) if d["Name"] == name]
+        elif section == "esg":
+            with mapping.collecting() as missing:
+                deploy = self.deploy_data('NSX Edge Deploy', name, missing)
+                settings = self.index('NSX Edge Settings', "Edge Name", missing)
+                routing = self.index('NSX Edge Routing', "Edge Name", missing)
+                found = [complete_esg(esg, settings, routing, missing) for esg in iter_esg(deploy, missing)]
+        elif section == "dlr":
+            with mapping.collecting() as missing:
+                deploy = self.deploy_data('DLR Deploy', name, missing)
+                settings = self.index('DLR Settings', "DLR Name", missing)
+                routing = self.index('DLR Routing', "DLR Name", missing)
+                bridging = self.index('DLR Bridding', "DLR Name", missing)
+                found = [complete_dlr(dlr, settings, routing, bridging, missing) for dlr in iter_dlr(deploy, missing)]
+        else:
+            raise ValueError("Unknown section {}.".format(section))
+
+        if not found: raise KeyError("{} named {} is not found.".format(section, name))
+        self._devices[key] = found[0]
+        return found[0]
+
+def convert_section(ws_data, section, convert):
+    with profiling.stage("convert", section):
+        return list(convert(ws_data))
+
+# missing labels of all sections are reported together.
+def convert_all(ws_data):
+    converted = []
+    errors = []
+    for section, _, convert in SECTIONS:
+        try:
+            converted.append(convert_section(ws_data, section, convert))
+        except mapping.MappingError as e:
+            errors.append(str(e))
+    if errors: raise mapping.MappingError("; ".join(errors))
+    return converted
+
+# convert with cache. sections whose sheets are not changed are taken from cache without extraction and conversion.
+def convert_cached(parameter_sheet, cache, jobs = 1):
+    workbook_hash = sheet_cache.file_hash(parameter_sheet)
+    sheet_hashes = cache.get("workbook", workbook_hash)
+    ws_data = None
+
+    if sheet_hashes is None:
+        ws_data, sheet_hashes = load_sheets(parameter_sheet, jobs, cache)
+        cache.put("workbook", workbook_hash, sheet_hashes)
+
+    results = []
+    errors = []
+    for section, sheet_names, convert in SECTIONS:
+        key = section + ":" + ":".join(sheet_hashes[sheet_name] for sheet_name in sheet_names)
+        converted = cache.get("converted", key)
+        if converted is None:
+            if ws_data is None:
+                ws_data = {sheet_name: cache.get("sheet", sheet_hashes[sheet_name]) for sheet_name, _ in SHEETS}
+                if any(data is None for data in ws_data.values()):
+                    # some sheets were evicted.
+                    ws_data, _ = load_sheets(parameter_sheet, jobs, cache)
+            try:
+                converted = convert_section(ws_data, section, convert)
+            except mapping.MappingError as e:
+                errors.append(str(e))
+                continue
+            cache.put("converted", key, converted)
+        results.append(converted)
+    if errors: raise mapping.MappingError("; ".join(errors))
+
+    return results
+
+# cache shared with other tools. entries are not reused after extractor or converter code changes.
+def open_cache(cache_dir, cache_size = 512):
+    return sheet_cache.SheetCache(cache_dir, cache_size * 1024 * 1024, [ex.__file__, mapping.__file__, models.__file__, __file__])
+
+def write_json(path, data):
+    with profiling.stage("write", os.path.basename(path)):
+        with open(path, "w") as f: f.write(changeset.dumps(data))
+
+# write one compact JSON object per line. devices may be a generator, so they are converted while written.
+# devices are written into temporary files, which are renamed only after all sections are converted without error.
+def write_jsonl_sections(output_dir, converted):
+    written = []
+    errors = []
+    try:
+        for (section, _, _), devices in zip(SECTIONS, converted):
+            path = os.path.join(output_dir, section + FORMATS["jsonl"])
+            with profiling.stage("write", os.path.basename(path)):
+                try:
+                    written.append([changeset.write_temporary(path, (changeset.dumps_line(device) + "\n" for device in devices)), path])
+                except mapping.MappingError as e:
+                    errors.append(str(e))
+        if errors: raise mapping.MappingError("; ".join(errors))
+    except BaseException:
+        for tmp_path, _ in written: os.remove(tmp_path)
+        raise
+
+    for tmp_path, path in written:
+        os.replace(tmp_path, path)
+
+# write each device to file as soon as it is converted, like {"section": "esg", "device": {...}}.
+# devices written before an error are not taken back, so consumers must check the exit status.
+def write_jsonl_stream(file, converted):
+    errors = []
+    for (section, _, _), devices in zip(SECTIONS, converted):
+        try:
+            for device in devices:
+                file.write(changeset.dumps_line({"section": section, "device": device}) + "\n")
+                file.flush()
+        except mapping.MappingError as e:
+            errors.append(str(e))
+    if errors: raise mapping.MappingError("; ".join(errors))
+
+# write ls, esg and dlr files in output_format ("json" or "jsonl").
+# with incremental = True, files are rewritten atomically only when their content is changed,
+# and added / changed / removed device names against the previous output are written to changes.json.
+def write_outputs(output_dir, converted, incremental = False, output_format = "json"):
+    if output_dir == STDOUT:
+        write_jsonl_stream(sys.stdout, converted)
+        return {}
+    if output_format == "jsonl" and not incremental:
+        write_jsonl_sections(output_dir, converted)
+        return {}
+
+    changes = {}
+    for (section, _, _), data in zip(SECTIONS, converted):
+        path = os.path.join(output_dir, section + FORMATS[output_format])
+        if not incremental:
+            write_json(path, data)
+            continue
+
+        with profiling.stage("write", os.path.basename(path)):
+            data = list(data)
+            changes[section] = changeset.compare(changeset.load_previous(path), data)
+            changeset.write_if_changed(path, changeset.dumps_as(data, output_format))
+
+    if incremental:
+        changeset.write_atomic(os.path.join(output_dir, "changes.json"), changeset.dumps(changes))
+    return changes
+
+# validate converted devices and raise ValidationError on errors, before any file is written.
+def validate_converted(converted):
+    with profiling.stage("validate"):
+        problems = validation.validate(*converted)
+    if problems: validation.print_problems(problems)
+    errors = validation.errors(problems)
+    if errors: raise validation.ValidationError("{} validation errors".format(len(errors)))
+
+# with plan = True, deployment plan is also written to plan.json.
+# with columnar_format = "csv" or "parquet", routing tables are also written by columnar.write_tables().
+def convert_workbook(parameter_sheet, output_dir, jobs = 1, cache = None, incremental = False, output_format = "json", validate = False, plan = False, columnar_format = None):
+    if cache is None:
+        ws_data, _ = load_sheets(parameter_sheet, jobs)
+        if output_format == "jsonl" and not (incremental or validate or plan or columnar_format):
+            # keep generators, so each device is written as soon as it is converted.
+            converted = [convert(ws_data) for _, _, convert in SECTIONS]
+        else:
+            converted = convert_all(ws_data)
+    else:
+        converted = convert_cached(parameter_sheet, cache, jobs)
+
+    if validate: validate_converted(converted)
+    if plan:
+        with profiling.stage("plan"):
+            deploy_plan.write_plan(os.path.join(output_dir, "plan.json"), deploy_plan.build_plan(*converted), incremental)
+    if columnar_format:
+        with profiling.stage("columnar"):
+            site = os.path.splitext(os.path.basename(parameter_sheet))[0]
+            columnar.write_tables(output_dir, columnar.build_tables(converted[1], converted[2], site), columnar_format)
+    return write_outputs(output_dir, converted, incremental, output_format)
+
+# find workbooks by directory or glob pattern like 'sheets/**/*.xlsx'.
+def find_workbooks(pattern):
+    if os.path.isdir(pattern): pattern = os.path.join(pattern, "*.xlsx")
+    # skip lock files of Excel like '~$sheet.xlsx'.
+    return sorted(p for p in glob.glob(pattern, recursive = True) if not os.path.basename(p).startswith("~$"))
+
+# convert one workbook of batch. this runs in worker process when jobs > 1.
+def convert_batch_entry(parameter_sheet, output_dir, cache = None, incremental = False, output_format = "json", validate = False, plan = False, columnar_format = None):
+    start = time.perf_counter()
+    try:
+        os.makedirs(output_dir, exist_ok = True)
+        convert_workbook(parameter_sheet, output_dir, cache = cache, incremental = incremental, output_format = output_format, validate = validate, plan = plan, columnar_format = columnar_format)
+        error = None
+    except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+    return [parameter_sheet, output_dir, time.perf_counter() - start, error]
+
+# convert all workbooks matched to pattern into '<output_dir>/<workbook name>/'.
+# returns the number of failed workbooks.
+def convert_batch(pattern, output_dir, jobs = 1, cache = None, incremental = False, output_format = "json", validate = False, plan = False, columnar_format = None):
+    workbooks = find_workbooks(pattern)
+    if not workbooks:
+        print("No workbook matches to {}.".format(pattern), file = sys.stderr)
+        return 1
+
+    entries = []
+    used_names = {}
+    for parameter_sheet in workbooks:
+        name = os.path.splitext(os.path.basename(parameter_sheet))[0]
+        used_names[name] = used_names.get(name, 0) + 1
+        if used_names[name] > 1: name = "{}_{}".format(name, used_names[name])
+        entries.append([parameter_sheet, os.path.join(output_dir, name), cache, incremental, output_format, validate, plan, columnar_format])
+
+    start = time.perf_counter()
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers = jobs) as executor:
+            futures = [executor.submit(convert_batch_entry, *entry) for entry in entries]
+            results = [future.result() for future in futures]
+    else:
+        results = [convert_batch_entry(*entry) for entry in entries]
+    elapsed = time.perf_counter() - start
+
+    failures = [r for r in results if r[3]]
+    for parameter_sheet, entry_dir, seconds, error in results:
+        if error:
+            print("FAIL {:8.2f}s {} : {}".format(seconds, parameter_sheet, error))
+        else:
+            print("OK   {:8.2f}s {} -> {}".format(seconds, parameter_sheet, entry_dir))
+    print("{} workbooks, {} succeeded, {} failed in {:.2f}s".format(len(results), len(results) - len(failures), len(failures), elapsed))
+
+    return len(failures)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Convert Excel parameter sheet to JSON files.")
+    parser.add_argument("parameter_sheet", help = "parameter sheet (.xlsx), or directory / glob pattern of parameter sheets with --batch")
+    parser.add_argument("output_dir", nargs = "?", default = ".", help = "output directory (default: current directory). '-' streams devices to stdout with --format jsonl")
+    parser.add_argument("-j", "--jobs", type = int, default = 1, help = "number of worker processes (default: 1)")
+    parser.add_argument("--batch", action = "store_true", help = "convert all matched workbooks into per-workbook folders of output directory")
+    parser.add_argument("--cache-dir", help = "directory to cache extracted sheets and converted results")
+    parser.add_argument("--cache-size", type = int, default = 512, help = "maximum size of cache in MB (default: 512)")
+    parser.add_argument("--format", choices = sorted(FORMATS), default = "json", help = "output format. jsonl writes one device per line to ls.jsonl, esg.jsonl and dlr.jsonl (default: json)")
+    parser.add_argument("--incremental", action = "store_true", help = "rewrite output files only when changed and write changed device names to changes.json")
+    parser.add_argument("--validate", action = "store_true", help = "validate converted devices and exit with status 1 without writing files when errors are found")
+    parser.add_argument("--plan", action = "store_true", help = "write deployment plan, dependencies of devices on logical switches and waves of devices deployable concurrently, to plan.json")
+    parser.add_argument("--columnar", choices = sorted(columnar.FORMATS), help = "also write BGP neighbors, static routes, IP prefixes and redistribution criteria as flat tables in CSV or Parquet. Parquet requires pyarrow")
+    parser.add_argument("--profile", nargs = "?", const = "profile.json", help = "record time, cell reads and peak memory of each stage and write report to PROFILE (default: profile.json). also enabled by environment variable " + profiling.ENV_NAME)
+    parser.add_argument("--profile-no-memory", action = "store_true", help = "do not trace memory while profiling")
+    parser.add_argument("--profile-dump", help = "write cProfile statistics to this file")
+    args = parser.parse_args()
+
+    if args.output_dir == STDOUT and (args.format != "jsonl" or args.batch or args.incremental or args.plan or args.columnar):
+        print("Output to stdout needs --format jsonl, and cannot be used with --batch, --incremental, --plan or --columnar.", file = sys.stderr)
+        sys.exit(1)
+
+    if args.columnar == "parquet":
+        try:
+            columnar.require_pyarrow()
+        except RuntimeError as e:
+            print(e, file = sys.stderr)
+            sys.exit(1)
+
+    profile_report = args.profile or profiling.env_report_path()
+    if profile_report:
+        if args.batch:
+            print("Profiling is not supported with --batch.", file = sys.stderr)
+            profile_report = None
+        else:
+            profiling.enable(memory = not args.profile_no_memory)
+
+    profiler = None
+    if args.profile_dump:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    cache = None
+    if args.cache_dir:
+        cache = open_cache(args.cache_dir, args.cache_size)
+
+    if args.batch:
+        failures = convert_batch(args.parameter_sheet, args.output_dir, args.jobs, cache, args.incremental, args.format, args.validate, args.plan, args.columnar)
+        sys.exit(1 if failures else 0)
+
+    status = 0
+    try:
+        with profiling.stage("total"):
+            convert_workbook(args.parameter_sheet, args.output_dir, args.jobs, cache, args.incremental, args.format, args.validate, args.plan, args.columnar)
+    except (validation.ValidationError, mapping.MappingError) as e:
+        print("{} is rejected: {}.".format(args.parameter_sheet, e), file = sys.stderr)
+        status = 1
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile_dump)
+    if profile_report:
+        profiling.write_report(profile_report)
+        profiling.print_summary()
+    sys.exit(status)
+
+if __name__ == '__main__':
+    main()
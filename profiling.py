@@ -0,0 +1,116 @@
+﻿import contextlib, json, os, sys, time, tracemalloc
+
+# opt-in instrumentation of conversion stages.
+#
+# stage() records wall time, peak memory and counters of each stage per sheet.
+# it does nothing until enable() is called, so instrumented code costs almost nothing by default.
+# set environment variable AUTONSX_PROFILE=<report path> to enable it without command line options.
+
+ENV_NAME = "AUTONSX_PROFILE"
+
+records = []
+stack = []
+enabled = False
+trace_memory = True
+
+def enable(memory = True):
+    global enabled, trace_memory
+    enabled = True
+    trace_memory = memory
+    if trace_memory and not tracemalloc.is_tracing(): tracemalloc.start()
+
+def disable():
+    global enabled
+    enabled = False
+    if tracemalloc.is_tracing(): tracemalloc.stop()
+
+def reset():
+    del records[:]
+    del stack[:]
+
+# report path set by environment variable, or None.
+def env_report_path():
+    value = os.environ.get(ENV_NAME, "")
+    if value in ("", "0"): return None
+    if value == "1": return "profile.json"
+    return value
+
+_disabled_stage = contextlib.nullcontext()
+
+def stage(name, sheet = None, grid = None):
+    if not enabled: return _disabled_stage
+    return _stage(name, sheet, grid)
+
+@contextlib.contextmanager
+def _stage(name, sheet, grid):
+    record = {"stage": name, "sheet": sheet, "depth": len(stack), "seconds": 0.0, "peak_bytes": 0, "counters": {}}
+    records.append(record)
+
+    if trace_memory:
+        # keep the peak of parent stage before resetting it for this stage.
+        current, peak = tracemalloc.get_traced_memory()
+        if stack: stack[-1]["_peak"] = max(stack[-1]["_peak"], peak - stack[-1]["_base"])
+        tracemalloc.reset_peak()
+        record["_base"] = current
+        record["_peak"] = 0
+    reads = grid.reads if grid is not None else 0
+    stack.append(record)
+
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        stack.pop()
+        if grid is not None: add("cell_reads", grid.reads - reads, record)
+        if trace_memory:
+            base = record.pop("_base")
+            record["peak_bytes"] = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1] - base, 0)
+            # peak of this stage is also the peak of parent stage.
+            if stack: stack[-1]["_peak"] = max(stack[-1]["_peak"], base + record["peak_bytes"] - stack[-1]["_base"])
+
+# add counter to the record, or to the current stage.
+def add(counter, n, record = None):
+    if not enabled: return
+    if record is None:
+        if not stack: return
+        record = stack[-1]
+    record["counters"][counter] = record["counters"].get(counter, 0) + n
+
+# merge records made in worker process as children of the current stage.
+def merge(worker_records):
+    depth = len(stack)
+    for r in worker_records:
+        r = dict(r)
+        r["depth"] += depth
+        records.append(r)
+
+def totals():
+    result = {}
+    for r in records:
+        key = r["stage"]
+        total = result.setdefault(key, {"calls": 0, "seconds": 0.0, "peak_bytes": 0, "counters": {}})
+        total["calls"] += 1
+        total["seconds"] += r["seconds"]
+        total["peak_bytes"] = max(total["peak_bytes"], r["peak_bytes"])
+        for counter, n in r["counters"].items():
+            total["counters"][counter] = total["counters"].get(counter, 0) + n
+    return result
+
+def report():
+    return {"memory_traced": trace_memory, "stages": records, "totals": totals()}
+
+def write_report(path):
+    with open(path, "w") as f: f.write(json.dumps(report(), ensure_ascii = False, indent = 4))
+
+def summary():
+    # cells column shows cells loaded for 'load' stage and cell reads for others.
+    lines = ["{:<40} {:>10} {:>12} {:>12}".format("stage", "seconds", "peak KiB", "cells")]
+    for r in records:
+        label = "  " * r["depth"] + r["stage"]
+        if r["sheet"]: label += " [{}]".format(r["sheet"])
+        lines.append("{:<40} {:>10.4f} {:>12.1f} {:>12}".format(label[:40], r["seconds"], r["peak_bytes"] / 1024, r["counters"].get("cell_reads", r["counters"].get("cells", ""))))
+    return "\n".join(lines)
+
+def print_summary(file = sys.stderr):
+    print(summary(), file = file)
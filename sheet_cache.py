@@ -0,0 +1,94 @@
+﻿import hashlib, os, pickle, sys, tempfile
+import extractor as ex
+
+# on-disk cache of extracted sheets and converted results.
+#
+# entries are pickled into '<cache_dir>/<kind>-<sha256>.pickle'.
+#   workbook  : workbook file hash -> {sheet name: sheet hash}
+#   sheet     : sheet content hash -> result of extractor.extract()
+#   converted : section name and its sheet hashes -> converted list
+# every key includes the hash of the extractor and converter source, so entries are not reused after code changes.
+# the least recently used entries are removed when the total size exceeds max_bytes.
+class SheetCache:
+    def __init__(self, cache_dir, max_bytes = 512 * 1024 * 1024, code_files = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = code_version(code_files or [ex.__file__])
+        os.makedirs(cache_dir, exist_ok = True)
+
+    def path(self, kind, key):
+        digest = hashlib.sha256("{}\0{}\0{}".format(self.version, kind, key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "{}-{}.pickle".format(kind, digest))
+
+    def get(self, kind, key):
+        path = self.path(kind, key)
+        try:
+            with open(path, "rb") as f: value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("Cache entry {} is broken ({}).".format(path, e), file = sys.stderr)
+            return None
+
+        # update mtime to keep recently used entries.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, kind, key, value):
+        path = self.path(kind, key)
+
+        # write to temporary file and rename it, so other processes never read partial entries.
+        fd, tmp_path = tempfile.mkstemp(dir = self.cache_dir, suffix = ".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f: pickle.dump(value, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pickle"): continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append([st.st_mtime, st.st_size, name])
+            total += st.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes: break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+
+def code_version(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f: h.update(f.read())
+    return h.hexdigest()[:16]
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# hash of cell values and sheet type. repr() is stable for values read from workbook.
+def grid_hash(grid, sheet_type):
+    h = hashlib.sha256(sheet_type.encode("utf-8"))
+    for row in grid.rows:
+        h.update(repr(row).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
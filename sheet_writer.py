@@ -0,0 +1,430 @@
+﻿import argparse, os, sys, tempfile
+import changeset
+import extractor as ex
+import parameter_sheet_to_json as converter
+import openpyxl as px
+
+# write converted devices back into parameter sheet, in the layouts extractor.extract() reads.
+#
+# the workbook is written in write-only mode row by row, instead of setting cells one by one.
+# each device is made into key trees of [label, value, children], one tree per target column.
+# all target columns of a sheet share the key column, so repeatable items (vNICs, routes, neighbors, ...)
+# are padded with empty items up to the longest list of the sheet.
+# the converter reads padded items back as empty items, so devices whose lists would be padded are rejected
+# by padding_errors(). JSON converted from parameter sheet always passes it, and check_round_trip() verifies the rest.
+
+KEY_COLUMNS = 5  # column B to F are used for keys.
+FIRST_TARGET_COLUMN = 2 + KEY_COLUMNS + 1  # after key columns and '既定値' column.
+
+APPLIANCE_SIZES = {"compact": "Compact", "large": "Large", "quadlarge": "Quad Large", "xlarge": "X-Large"}
+UNIVERSAL_INSTALL_TYPE = "Universal Logical (Distributed) Router"
+INSTALL_TYPE = "Logical (Distributed) Router"
+
+def marker(flag):
+    return "■" if flag else "□"
+
+# empty item used for padding. any key of it is also empty.
+class Blank:
+    def __getitem__(self, key):
+        return self
+
+    def get(self, key, default = None):
+        return self
+
+    def __contains__(self, key):
+        return False
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+BLANK = Blank()
+
+# value of cell which extractor reads back as the same value.
+def cell(value):
+    if value is None or isinstance(value, Blank): return ""
+    if isinstance(value, bool): return marker(value)
+    return value
+
+def padded(items, n):
+    return list(items) + [BLANK] * (n - len(items))
+
+# extractor needs at least one item of each repeatable key.
+def longest(devices, get_items):
+    return max([len(get_items(d)) for d in devices] + [1])
+
+# entry of key tree. value is written in target column of the key row.
+def key(label, value = None, children = None):
+    return [label, cell(value), children]
+
+def ls_column(i, ls):
+    mode = ls["ReplicationMode"]
+    if isinstance(mode, str) and mode.endswith("_MODE"): mode = mode[:-len("_MODE")].lower()
+    return [
+        key("Logical Switch #1", "No.{}".format(i + 1), [
+            key("Name", ls["Name"]),
+            key("Description", ls["Dscription"]),
+            key("Transport Zone", ls["TransportZone"]),
+            key("Replication mode", mode),
+            key("Enable IP Discovery", ls["EnableIpDiscovery"]),
+            key("Enable MAC Learning", ls["EnableMacLearning"]),
+        ]),
+    ]
+
+# appliances of ESG and DLR. the second appliance exists when HADatastore is set.
+def appliance_keys(label, device, appliances):
+    hosts = device["Host"] if isinstance(device["Host"], list) else [device["Host"]]
+    datastores = [device["Datastore"], device.get("HADatastore", "")]
+    return [
+        key("{} #{}".format(label, a + 1), None, [
+            key("Cluster/Resource Pool", device["Cluster"]),
+            key("Datastore", datastores[a] if a < len(datastores) else ""),
+            key("Host", hosts[a] if a < len(hosts) else ""),
+            key("Folder", device["Folder"]),
+        ]) for a in range(appliances)
+    ]
+
+def default_gateway_keys(device):
+    return [
+        key("Configure Default Gateway", device["ConfigureDefaultGateway"]),
+        key("vNIC", device["GatewayvNIC"]),
+        key("Gateway IP", device["GatewayIP"]),
+        key("MTU", device["GatewayMTU"]),
+        key("Admin Distance", device["GatewayAdminDistance"]),
+    ]
+
+def syslog_keys(syslog):
+    servers = padded(syslog.get("SyslogServers") or [], 2)
+    return [
+        key("Details", None, [
+            key("Syslog Servers", None, [
+                key("Syslog Server 1", servers[0]),
+                key("Syslog Server 2", servers[1]),
+                key("Protocol", syslog["Protocol"]),
+            ]),
+        ]),
+    ]
+
+def appliance_count(devices):
+    return 2 if any("HADatastore" in d for d in devices) else 1
+
+# devices whose items would be padded, as messages. lists is [[label, items of device]].
+def padding_errors(title, devices, lists, appliances = None):
+    errors = []
+    for label, get_items in lists:
+        n = longest(devices, get_items)
+        errors.extend("{} has {} {} in {}, but {} are written for each device.".format(d["Name"], len(get_items(d)), label, title, n)
+                      for d in devices if not isinstance(d, Blank) and len(get_items(d)) != n)
+    if appliances == 2:
+        errors.extend("{} has no HADatastore in {}, but the second appliance is written for each device.".format(d["Name"], title)
+                      for d in devices if not isinstance(d, Blank) and "HADatastore" not in d)
+    return errors
+
+def esg_deploy_column(esg, appliances):
+    size = esg["ApplianceSize"]
+    return [
+        key("Name and description", esg["Name"], [
+            key("Name", esg["Name"]),
+            key("Hostname", esg["Hostname"]),
+            key("Enable High Availability", esg["EnableHighAvailability"]),
+        ]),
+        key("Settings", None, [
+            key("Password", esg["Password"]),
+            key("Enable SSH access", esg["EnableSSHaccess"]),
+            key("Enable FIPS mode", esg["EnableFIPSmode"]),
+            key("Enable auto rule generation", esg["EnableAutoRuleGeneration"]),
+            key("Edge Control Level Logging", esg["EdgeControlLevelLogging"]),
+        ]),
+        key("Configure deployment", None, [
+            key("Datacenter", esg["Datacenter"]),
+            key("Appliance Size", APPLIANCE_SIZES.get(size, size)),
+        ] + appliance_keys("NSX Edge Appliance", esg, appliances)),
+        key("Default gateway settings", None, default_gateway_keys(esg)),
+        key("Firewall and HA", None, [
+            key("Configure Firewall default policy", esg["ConfigureFirewallDefaultPolicy"]),
+            key("Default Traffic Policy", esg["DefaultTrafficPolicy"]),
+            key("Logging", esg["DefaultFirewallLogging"]),
+            key("vNIC", esg["HAvNIC"]),
+            key("Declare Dead Time", esg["HADeclareDeadTime"]),
+            key("Management IPs", esg["HAManagementIPs"]),
+        ]),
+    ]
+
+def esg_settings_column(esg, vnics):
+    return [
+        key("Edge Name", esg["Name"]),
+        key("Interfaces", None, [
+            key("vNIC #{}".format(v + 1), None, [
+                key("Name", i["Name"]),
+                key("Type", i["Type"]),
+                key("Connected To", i["ConnectedTo"]),
+                key("Configure Subnets", None, [
+                    key("PrimaryIP Address", i["PrimaryIPAddress"]),
+                    key("SecondaryIP Addresses", i["SecondaryIPAddress"]),
+                    key("Subnet Prefix Length", i["SubnetPrefixLength"]),
+                    key("MTU", i["MTU"]),
+                    key("Options", None, [
+                        key("Enable Proxy ARP", i["EnableProxyARP"]),
+                        key("Send ICMP Redirect", i["SendICMPRedirect"]),
+                        key("Reverse Path Filter", i["ReversePathFilter"]),
+                    ]),
+                ]),
+            ]) for v, i in enumerate(padded(esg["Interfaces"], vnics))
+        ]),
+        key("Configuration", None, syslog_keys(esg["Syslog"])),
+    ]
+
+# repeatable items of routing sheet. [count key, label, items of device]
+ROUTING_ITEMS = [
+    ["routes", "static routes", lambda d: d["StaticRoute"]],
+    ["neighbors", "BGP neighbors", lambda d: d["Bgp"]["Neighbors"]],
+    ["prefixes", "IP prefixes", lambda d: d["RouteRedistribution"]["IPPrefixes"]],
+    ["criteria", "redistribution criteria", lambda d: d["RouteRedistribution"]["RouteRedistributionTable"]],
+]
+
+# numbers of repeatable items of routing sheet.
+def routing_counts(devices):
+    return {count_key: longest(devices, get_items) for count_key, _, get_items in ROUTING_ITEMS}
+
+# 'NSX Edge Routing' and 'DLR Routing' have almost same layout.
+def routing_column(device, counts, dlr = False):
+    g = device["GlobalConfiguration"]
+    default_gateway = [key("vNIC", g["DefaultGateway"]["vNIC"]), key("Gateway IP", g["DefaultGateway"]["GatewayIP"]), key("MTU", g["DefaultGateway"]["MTU"])]
+    if not dlr: default_gateway.append(key("Admin Distance", g["DefaultGateway"]["AdminDistance"]))
+
+    o = device["Ospf"]
+    b = device["Bgp"]
+    if dlr:
+        ospf = [key("Status", o["Status"]), key("Protocol Address", o["ProtocolAddress"]), key("Forwarding Address", o["ForwardingAddress"]), key("Graceful Restart", o["GracefulRestart"])]
+        bgp = [key("Status", b["Status"]), key("Graceful Restart", b["GracefulRestart"]), key("Local AS", b["LocalAS"])]
+    else:
+        ospf = [key("Status", o["Status"]), key("Graceful Restart", o["GracefulRestart"]), key("Default Originate", o["DefaultOriginate"])]
+        bgp = [key("Status", b["Status"]), key("Local AS", b["LocalAS"]), key("Graceful Restart", b["GracefulRestart"]), key("Default Originate", b["DefaultOriginate"])]
+
+    neighbor_list = []
+    for n, neighbor in enumerate(padded(b["Neighbors"], counts["neighbors"])):
+        keys = []
+        if dlr: keys.append(key("Interface", neighbor["Interface"]))
+        keys.append(key("IP Address", neighbor["IPAddress"]))
+        if dlr:
+            keys.append(key("Forwarding Address", neighbor["ForwardingAddress"]))
+            keys.append(key("Protocol Address", neighbor["ProtocolAddress"]))
+        keys.append(key("Remote AS", neighbor["RemoteAS"]))
+        if not dlr: keys.append(key("Remove Private AS", neighbor["RemovePrivateAS"]))
+        keys.extend([key("Weight", neighbor["Weight"]), key("Keep Alive Time", neighbor["KeepAliveTime"]), key("Hold Down Time", neighbor["HoldDownTime"]), key("Password", neighbor["Password"])])
+        neighbor_list.append(key("Neighbor #{}".format(n + 1), None, keys))
+    bgp.append(key("Neighbors", None, neighbor_list))
+
+    redistribution = device["RouteRedistribution"]
+    return [
+        key("DLR Name" if dlr else "Edge Name", device["Name"]),
+        key("Global Configuration", None, [
+            key("Dynamic Routing Configuration", None, [key("Router ID", g["RouterId"])]),
+            key("ECMP", g["ECMP"]),
+            key("Default Gateway", None, default_gateway),
+        ]),
+        key("Static routes", None, [
+            key("route #{}".format(r + 1), None, [
+                key("Network", route["Network"]),
+                key("Next Hop", route["NextHop"]),
+            ]) for r, route in enumerate(padded(device["StaticRoute"], counts["routes"]))
+        ]),
+        key("OSPF", None, ospf),
+        key("BGP", None, bgp),
+        key("Route Redistribution", None, [
+            key("IP Prefixes", None, [
+                key("IP Prefix #{}".format(p + 1), None, [
+                    key("Name", prefix["Name"]),
+                    key("IP/Network", prefix["IP/Network"]),
+                ]) for p, prefix in enumerate(padded(redistribution["IPPrefixes"], counts["prefixes"]))
+            ]),
+            key("Route Redistribution Table", None, [
+                key("Redistribution Criteria #{}".format(c + 1), None, [
+                    key("Prefix Name", criteria["PrefixName"]),
+                    key("Learner Protocol", criteria["LearnerProtocol"]),
+                    key("Allow Learning from", None, [
+                        key("OSPF", criteria["AllowLearningFrom"]["OSPF"]),
+                        key("BGP", criteria["AllowLearningFrom"]["BGP"]),
+                        key("Static Routes", criteria["AllowLearningFrom"]["StaticRoutes"]),
+                        key("Connected", criteria["AllowLearningFrom"]["Connected"]),
+                    ]),
+                    key("Action", criteria["Action"]),
+                ]) for c, criteria in enumerate(padded(redistribution["RouteRedistributionTable"], counts["criteria"]))
+            ]),
+        ]),
+    ]
+
+def dlr_deploy_column(dlr, appliances):
+    return [
+        key("Name and description", dlr["Name"], [
+            key("Install Type", UNIVERSAL_INSTALL_TYPE if dlr["Universal"] else INSTALL_TYPE),
+            key("Local Egress", dlr["LocalEgress"]),
+            key("Name", dlr["Name"]),
+            key("Hostname", dlr["Hostname"]),
+            key("Enable High Availability", dlr["EnableHighAvailability"]),
+        ]),
+        key("Settings", None, [
+            key("Password", dlr["Password"]),
+            key("Enable SSH access", dlr["EnableSSHaccess"]),
+            key("Enable FIPS mode", dlr["EnableFIPSmode"]),
+            key("Edge Control Level Logging", dlr["EdgeControlLevelLogging"]),
+        ]),
+        key("Configure deployment", None, [
+            key("Datacenter", dlr["Datacenter"]),
+        ] + appliance_keys("DLR Appliance", dlr, appliances)),
+        key("Configure interfaces", None, [
+            key("HA Interface Configuration", None, [
+                key("Connected To", dlr["ConnectedTo"]),
+                key("Primary IP Address", dlr["PrimaryIPAddress"]),
+                key("Subnet Prefix Length", dlr["SubnetPrefixLength"]),
+            ]),
+        ]),
+        key("Default gateway settings", None, default_gateway_keys(dlr)),
+    ]
+
+# 'DLR Settings' has one column per interface. only the first column of DLR has its name and syslog.
+def dlr_settings_columns(dlr):
+    columns = []
+    for v, i in enumerate(dlr["Interfaces"] or [BLANK]):
+        columns.append([
+            key("DLR Name", dlr["Name"] if v == 0 else ""),
+            key("Interfaces", None, [
+                key("vNIC #1", None, [
+                    key("Name", i["Name"]),
+                    key("Type", i["Type"]),
+                    key("Connected To", i["ConnectedTo"]),
+                    key("Configure Subnets", None, [
+                        key("PrimaryIP Address", i["PrimaryIPAddress"]),
+                        key("Subnet Prefix Length", i["SubnetPrefixLength"]),
+                        key("MTU", i["MTU"]),
+                    ]),
+                ]),
+            ]),
+            key("Configuration", None, syslog_keys(dlr["Syslog"] if v == 0 else BLANK)),
+        ])
+    return columns
+
+# 'DLR Bridding' has one column per bridge.
+def dlr_bridge_columns(dlr):
+    columns = []
+    for n, b in enumerate(dlr["Bridge"] or [BLANK]):
+        columns.append([
+            key("DLR Name", dlr["Name"] if n == 0 else ""),
+            key("Bridges", None, [
+                key("Bridge #1", None, [
+                    key("Name", b["Name"]),
+                    key("Logical Switch", b["LogicalSwitch"]),
+                    key("Distributed Port Group", b["DistributedPortGroup"]),
+                ]),
+            ]),
+        ])
+    return columns
+
+def flatten(tree, depth = 0, rows = None):
+    if rows is None: rows = []
+    for label, value, children in tree:
+        rows.append([depth, label, value])
+        if children: flatten(children, depth + 1, rows)
+    return rows
+
+# extractor scans header line up to ex.MAX_COLUMN.
+def check_columns(title, columns, default_column = True):
+    first = FIRST_TARGET_COLUMN if default_column else FIRST_TARGET_COLUMN - 1
+    if first + len(columns) > ex.MAX_COLUMN:
+        raise ValueError("{} needs {} columns, but extractor reads only {} columns. Split devices into several workbooks.".format(title, len(columns), ex.MAX_COLUMN - first))
+
+# write key trees into sheet. all trees must have same keys.
+# row 4 is the header line: key, '既定値' (default value) column, target columns and '備考' (remarks).
+def write_sheet(wb, title, columns, default_column = True):
+    ws = wb.create_sheet(title)
+    ws.append([title])
+    ws.append([])
+    ws.append([])
+
+    flat_columns = [flatten(column) for column in columns]
+    for r, (depth, label, _) in enumerate(flat_columns[0]):
+        row = [None] * (1 + KEY_COLUMNS)
+        row[1 + depth] = label
+        if default_column: row.append("既定値" if r == 0 else None)
+        for flat in flat_columns:
+            row.append(flat[r][2])
+        if r == 0: row.append("備考")
+        ws.append(row)
+
+# sheets without devices are written with an empty column, to keep their keys.
+# devices and columns are checked before the workbook is created.
+def write_workbook(path, ls_list, esg_list, dlr_list):
+    ls_list, esg_list, dlr_list = list(ls_list) or [BLANK], list(esg_list) or [BLANK], list(dlr_list) or [BLANK]
+
+    esg_appliances = appliance_count(esg_list)
+    vnics = longest(esg_list, lambda d: d["Interfaces"])
+    esg_counts = routing_counts(esg_list)
+    dlr_appliances = appliance_count(dlr_list)
+    dlr_counts = routing_counts(dlr_list)
+
+    # DLR interfaces and bridges are written one per column, and are never padded.
+    routing_lists = [[label, get_items] for _, label, get_items in ROUTING_ITEMS]
+    errors = padding_errors("NSX Edge Deploy", esg_list, [], esg_appliances)
+    errors += padding_errors("NSX Edge Settings", esg_list, [["vNICs", lambda d: d["Interfaces"]]])
+    errors += padding_errors("NSX Edge Routing", esg_list, routing_lists)
+    errors += padding_errors("DLR Deploy", dlr_list, [], dlr_appliances)
+    errors += padding_errors("DLR Routing", dlr_list, routing_lists)
+    if errors:
+        raise ValueError("\n".join(errors))
+
+    # [title, columns, default_column]
+    sheets = [
+        ["Logical Switches", [ls_column(i, ls) for i, ls in enumerate(ls_list)], False],
+        ["NSX Edge Deploy", [esg_deploy_column(esg, esg_appliances) for esg in esg_list], True],
+        ["NSX Edge Settings", [esg_settings_column(esg, vnics) for esg in esg_list], True],
+        ["NSX Edge Routing", [routing_column(esg, esg_counts) for esg in esg_list], True],
+        ["DLR Deploy", [dlr_deploy_column(dlr, dlr_appliances) for dlr in dlr_list], True],
+        ["DLR Settings", [column for dlr in dlr_list for column in dlr_settings_columns(dlr)], True],
+        ["DLR Routing", [routing_column(dlr, dlr_counts, dlr = True) for dlr in dlr_list], True],
+        ["DLR Bridding", [column for dlr in dlr_list for column in dlr_bridge_columns(dlr)], True],
+    ]
+    for title, columns, default_column in sheets:
+        check_columns(title, columns, default_column)
+
+    wb = px.Workbook(write_only = True)
+    for title, columns, default_column in sheets:
+        write_sheet(wb, title, columns, default_column)
+    wb.save(path)
+
+# convert the workbook written from devices and return names of sections whose JSON differs.
+def check_round_trip(ls_list, esg_list, dlr_list):
+    sections = [list(ls_list), list(esg_list), list(dlr_list)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "round_trip.xlsx")
+        write_workbook(path, *sections)
+        ws_data, _ = converter.load_sheets(path)
+    converted = converter.convert_all(ws_data)
+
+    return [section for (section, _, _), original, data in zip(converter.SECTIONS, sections, converted)
+            if changeset.dumps(original) != changeset.dumps(data)]
+
+def main():
+    parser = argparse.ArgumentParser(description = "Write converted JSON files back into parameter sheet.")
+    parser.add_argument("confdir", help = "directory of ls, esg and dlr files")
+    parser.add_argument("parameter_sheet", help = "parameter sheet (.xlsx) to write")
+    parser.add_argument("--check", action = "store_true", help = "convert the written workbook again and check it gives the same JSON")
+    args = parser.parse_args()
+
+    try:
+        sections = changeset.load_sections(args.confdir, [section for section, _, _ in converter.SECTIONS])
+        write_workbook(args.parameter_sheet, *sections)
+    except ValueError as e:
+        print(e, file = sys.stderr)
+        sys.exit(1)
+
+    if args.check:
+        differences = check_round_trip(*sections)
+        if differences:
+            print("JSON of {} differs after round trip.".format(", ".join(differences)), file = sys.stderr)
+            sys.exit(1)
+        print("Round trip gives the same JSON.", file = sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+﻿import re, zipfile
+import openpyxl
+import extractor as ex
+
+# openpyxl in read-only mode reads rows only up to <dimension> of the sheet, unless it is reset.
+
+def stale_dimension_workbook(path, rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Sheet"
+    for r in range(rows):
+        ws.append(["key{}".format(r), r])
+    wb.save(path)
+
+    # rewrite the dimension as if only the first two rows existed.
+    with zipfile.ZipFile(path) as z:
+        members = {info.filename: z.read(info.filename) for info in z.infolist()}
+    members["xl/worksheets/sheet1.xml"] = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="A1:B2"', members["xl/worksheets/sheet1.xml"])
+    with zipfile.ZipFile(path, "w") as z:
+        for name, data in members.items(): z.writestr(name, data)
+
+def test_grid_reads_rows_below_stale_dimension(tmp_path):
+    path = str(tmp_path / "stale.xlsx")
+    stale_dimension_workbook(path, 10)
+
+    wb = openpyxl.load_workbook(path, read_only = True, data_only = True)
+    try:
+        assert wb["Sheet"].max_row == 2
+        grid = ex.Grid(wb["Sheet"])
+    finally:
+        wb.close()
+    assert len(grid.rows) == 10
+    assert grid.value(10, 1) == "key9"
+    assert grid.value(10, 2) == 9
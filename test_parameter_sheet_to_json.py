@@ -0,0 +1,63 @@
+﻿import openpyxl
+import pytest
+import benchmark
+import changeset
+import mapping
+import parameter_sheet_to_json as converter
+import sheet_writer
+
+# ParameterSheet converts devices on demand and memoizes them.
+
+@pytest.fixture
+def parameter_sheet(tmp_path):
+    path = str(tmp_path / "parameter_sheet.xlsx")
+    benchmark.generate_workbook(path, edges = 3, dlrs = 2, logical_switches = 4, vnics = 2, lifs = 2)
+    return path
+
+def test_device_before_section(parameter_sheet):
+    with converter.ParameterSheet(parameter_sheet) as sheet:
+        esg = sheet.esg("ESG0001")
+        assert sheet.esgs[1] is esg
+        assert sheet.esg("ESG0002") is sheet.esgs[2]
+
+def test_section_before_device(parameter_sheet):
+    with converter.ParameterSheet(parameter_sheet) as sheet:
+        dlrs = sheet.dlrs
+        assert sheet.dlr("DLR0001") is dlrs[1]
+        assert sheet.logical_switch("LS0000") is sheet.logical_switches[0]
+
+def test_same_as_convert_all(parameter_sheet):
+    ws_data, _ = converter.load_sheets(parameter_sheet)
+    with converter.ParameterSheet(parameter_sheet) as sheet:
+        sheet.esg("ESG0000")
+        sections = [sheet.section(section) for section, _, _ in converter.SECTIONS]
+    assert changeset.dumps(sections) == changeset.dumps(converter.convert_all(ws_data))
+
+# rename the first key cell of label in sheet.
+def rename_label(wb, sheet_name, label):
+    for row in wb[sheet_name].iter_rows(max_col = 2 + sheet_writer.KEY_COLUMNS):
+        for c in row:
+            if c.value == label:
+                c.value = label + " (renamed)"
+                return
+    raise AssertionError("{} is not in {}".format(label, sheet_name))
+
+def test_missing_labels_are_reported_at_once(parameter_sheet):
+    wb = openpyxl.load_workbook(parameter_sheet)
+    rename_label(wb, 'NSX Edge Settings', "Edge Name")
+    rename_label(wb, 'NSX Edge Deploy', "Appliance Size")
+    rename_label(wb, 'DLR Routing', "DLR Name")
+    rename_label(wb, 'Logical Switches', "Transport Zone")
+    wb.save(parameter_sheet)
+
+    ws_data, _ = converter.load_sheets(parameter_sheet)
+    with pytest.raises(mapping.MappingError) as e:
+        converter.convert_all(ws_data)
+    message = str(e.value)
+    for expected in ["'Edge Name' is not found in NSX Edge Settings", "'Configure deployment > Appliance Size' is not found in NSX Edge Deploy",
+                     "'DLR Name' is not found in DLR Routing", "Transport Zone' is not found in Logical Switches"]:
+        assert expected in message
+
+    with converter.ParameterSheet(parameter_sheet) as sheet:
+        with pytest.raises(mapping.MappingError, match = "'Edge Name' is not found in NSX Edge Settings"):
+            sheet.esg("ESG0000")
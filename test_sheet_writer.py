@@ -0,0 +1,33 @@
+﻿import os
+import pytest
+import benchmark
+import changeset
+import parameter_sheet_to_json as converter
+import sheet_writer
+
+# devices written into parameter sheet are converted back into the same JSON.
+
+def devices(vnics = (3, 3)):
+    ls_list = [benchmark.ls_device(i) for i in range(4)]
+    esg_list = [benchmark.esg_device(i, v, len(ls_list), 2, 2, 2, 2) for i, v in enumerate(vnics)]
+    dlr_list = [benchmark.dlr_device(i, 2 + i, len(ls_list), 2, 2, 2, 2, 1 + i) for i in range(2)]
+    return [ls_list, esg_list, dlr_list]
+
+def test_round_trip(tmp_path):
+    sections = devices()
+    path = str(tmp_path / "round_trip.xlsx")
+    sheet_writer.write_workbook(path, *sections)
+
+    ws_data, _ = converter.load_sheets(path)
+    converted = converter.convert_all(ws_data)
+    for (section, _, _), original, data in zip(converter.SECTIONS, sections, converted):
+        assert changeset.dumps(data) == changeset.dumps(original), section
+
+def test_round_trip_without_devices():
+    assert sheet_writer.check_round_trip([], [], []) == []
+
+def test_padded_vnics_are_rejected(tmp_path):
+    path = str(tmp_path / "padded.xlsx")
+    with pytest.raises(ValueError, match = "ESG0001 has 2 vNICs"):
+        sheet_writer.write_workbook(path, *devices(vnics = (10, 2)))
+    assert not os.path.exists(path)
@@ -0,0 +1,71 @@
+﻿import pytest
+import benchmark
+import validation
+
+# devices are dicts like ones loaded from converted JSON.
+
+def interface(name, address, length, connected_to, type = "Internal"):
+    return {"Name": name, "Type": type, "ConnectedTo": connected_to, "PrimaryIPAddress": address, "SubnetPrefixLength": length, "SecondaryIPAddress": ""}
+
+def esg(name, router_id, interfaces, local_as = 65000, neighbors = (), static_routes = ()):
+    return {
+        "Name": name, "Datacenter": "DC01", "Cluster": "Cluster01", "Datastore": "Datastore00", "HADatastore": "Datastore01",
+        "Password": "VMware1!VMware1!", "EnableHighAvailability": True, "EnableFIPSmode": False, "EnableSSHaccess": True,
+        "EnableAutoRuleGeneration": True, "HAvNIC": "vnic1", "Syslog": {"SyslogServers": ["192.168.0.10"]},
+        "Interfaces": [interface("vnic0", "10.0.0.{}".format(router_id.split(".")[-1]), 24, "LS-UPLINK", "Uplink")] + list(interfaces),
+        "ConfigureDefaultGateway": False, "StaticRoute": [{"Network": n, "NextHop": "10.0.0.254"} for n in static_routes],
+        "GlobalConfiguration": {"RouterId": router_id},
+        "Bgp": {"Status": True, "LocalAS": local_as, "Neighbors": [{"IPAddress": a, "RemoteAS": remote_as} for a, remote_as in neighbors]},
+    }
+
+def messages(esg_list, level = validation.ERROR):
+    ls_list = [{"Name": name} for name in ["LS-UPLINK", "LS01", "LS02"]]
+    return [[device, message] for l, device, message in validation.validate(ls_list, esg_list, []) if l == level]
+
+@pytest.mark.parametrize("value, valid", [
+    ("10.0.0.0/24", True),
+    ("10.0.0.1/32", True),
+    ("0.0.0.0/0", True),
+    ("10.0.0.1", False),
+    ("10.0.0.0/255.255.255.0", False),
+    ("10.0.0.0/33", False),
+    ("10.0.0.0/", False),
+    ("10.0.0.0/24/1", False),
+    ("10.0.0/24", False),
+])
+def test_cidr_syntax(value, valid):
+    assert (validation.parse_cidr(value) is not None) == valid
+
+def test_static_route_without_prefix_length():
+    assert messages([esg("ESG01", "10.255.0.1", [], static_routes = ["192.168.0.0/24", "192.168.1.1"])]) == [
+        ["ESG [ESG01]", "Static route 192.168.1.1 is not valid CIDR."]]
+
+def test_overlapping_subnets():
+    esg_list = [
+        esg("ESG01", "10.255.0.1", [interface("vnic1", "10.1.0.1", 24, "LS01")]),
+        esg("ESG02", "10.255.0.2", [interface("vnic1", "10.1.0.129", 25, "LS02"), interface("vnic2", "10.2.0.1", 24, "LS01")]),
+        esg("ESG03", "10.255.0.3", [interface("vnic1", "10.2.0.2", 24, "LS01")]),
+    ]
+    assert messages(esg_list) == [["ESG [ESG02]", "Subnet 10.1.0.128/25 of ESG [ESG02] interface vnic1 (LS02) overlaps with 10.1.0.0/24 of ESG [ESG01] interface vnic1 (LS01)."]]
+
+def test_duplicated_router_ids():
+    esg_list = [esg("ESG01", "10.255.0.1", []), esg("ESG02", "10.255.0.1", []), esg("ESG03", "10.255.0.3", [])]
+    assert messages(esg_list) == [
+        ["ESG [ESG01]", "Router ID 10.255.0.1 is duplicated in ESG [ESG01], ESG [ESG02]."],
+        ["ESG [ESG02]", "Router ID 10.255.0.1 is duplicated in ESG [ESG01], ESG [ESG02]."],
+    ]
+
+def test_remote_as_matches_local_as_of_peer():
+    esg_list = [
+        esg("ESG01", "10.255.0.1", [], local_as = 65001, neighbors = [["10.0.0.2", 65002], ["10.0.0.3", 65099]]),
+        esg("ESG02", "10.255.0.2", [], local_as = "0.65002", neighbors = [["10.0.0.1", 65001]]),
+        esg("ESG03", "10.255.0.3", [], local_as = 65003, neighbors = [["10.0.0.1", "0.65001"]]),
+    ]
+    assert messages(esg_list) == [["ESG [ESG01]", "Remote AS 65099 of BGP neighbor 10.0.0.3 does not match local AS 65003 of ESG [ESG03]."]]
+
+# synthetic devices of benchmark are also a clean fixture, and validation can be timed with them.
+def test_benchmark_devices_have_no_errors():
+    ls_list = [benchmark.ls_device(i) for i in range(20)]
+    esg_list = [benchmark.esg_device(i, 10, len(ls_list), 2, 2, 2, 2) for i in range(5)]
+    dlr_list = [benchmark.dlr_device(i, 4, len(ls_list), 2, 2, 2, 2, 2) for i in range(3)]
+    assert validation.errors(validation.validate(ls_list, esg_list, dlr_list)) == []
@@ -0,0 +1,292 @@
+﻿import argparse, functools, ipaddress, sys
+import changeset
+
+# offline validation of converted devices.
+#
+# checks of Validate-NSX in AutoNSX_Validate.psm1 which do not need vCenter or NSX Manager,
+# and checks across all devices:
+#   IP address and CIDR syntax, overlapping subnets of interfaces connected to different networks,
+#   ConnectedTo and bridges against ls.json, duplicated router IDs, BGP AS numbers and neighbors of each other.
+# errors are like assert and warnings are like assert_should of Validate-NSX.
+# devices may be records of models or dicts loaded from JSON, since both are read by JSON key.
+
+ERROR = "error"
+WARNING = "warning"
+
+class ValidationError(Exception):
+    pass
+
+# the same addresses appear in many devices, so parsed results are memoized.
+@functools.lru_cache(maxsize = 65536)
+def parse_ip(value):
+    try:
+        return ipaddress.ip_address(str(value).strip())
+    except ValueError:
+        return None
+
+# CIDR like 10.0.0.0/24. like Validate-CIDR, the prefix length must be a number from 0 to 32,
+# so an address without prefix length or with netmask is not valid.
+@functools.lru_cache(maxsize = 65536)
+def parse_cidr(value):
+    parts = str(value).strip().split("/")
+    if len(parts) != 2 or not (parts[1].isascii() and parts[1].isdigit()) or int(parts[1]) > 32: return None
+    try:
+        return ipaddress.IPv4Network("/".join(parts), strict = False)
+    except ValueError:
+        return None
+
+# AS number as int, from 65000 or asdot notation like 1.10.
+def parse_as(value):
+    if isinstance(value, bool): return None
+    if isinstance(value, int): n = value
+    else:
+        s = str(value).strip()
+        if s.count(".") == 1 and all(p.isdigit() for p in s.split(".")):
+            high, low = [int(p) for p in s.split(".")]
+            if high > 65535 or low > 65535: return None
+            n = high * 65536 + low
+        elif s.isdigit():
+            n = int(s)
+        else:
+            return None
+    return n if 1 <= n <= 4294967295 else None
+
+class Validator:
+    def __init__(self, ls_list, esg_list, dlr_list):
+        self.ls_list = list(ls_list)
+        self.esg_list = list(esg_list)
+        self.dlr_list = list(dlr_list)
+        self.ls_names = set(ls["Name"] for ls in self.ls_list)
+        self.problems = []
+        self._subnets = None
+
+    def error(self, device, message):
+        self.problems.append([ERROR, device, message])
+
+    def warning(self, device, message):
+        self.problems.append([WARNING, device, message])
+
+    def check_ip(self, device, value, label):
+        if not value:
+            self.error(device, "{} is not set.".format(label))
+        elif parse_ip(value) is None:
+            self.error(device, "{} {} is not valid IP address.".format(label, value))
+
+    def check_cidr(self, device, value, label):
+        if not value:
+            self.error(device, "{} is not set.".format(label))
+        elif parse_cidr(value) is None:
+            self.error(device, "{} {} is not valid CIDR.".format(label, value))
+
+    def validate(self):
+        self.check_names("LogicalSwitch", self.ls_list)
+        self.check_names("ESG", self.esg_list)
+        self.check_names("DLR", self.dlr_list)
+        for esg in self.esg_list:
+            self.check_edge("ESG", esg)
+        for dlr in self.dlr_list:
+            self.check_edge("DLR", dlr)
+            self.check_dlr(dlr)
+        self.check_overlaps()
+        self.check_router_ids()
+        self.check_bgp()
+        return self.problems
+
+    def check_names(self, kind, device_list):
+        names = set()
+        for d in device_list:
+            name = d["Name"]
+            if not name:
+                self.error("{} []".format(kind), "Name is not set.")
+            elif name in names:
+                self.error("{} [{}]".format(kind, name), "Name is duplicated.")
+            names.add(name)
+
+    # checks common to ESG and DLR.
+    def check_edge(self, kind, e):
+        device = "{} [{}]".format(kind, e["Name"])
+
+        for key in ["Datacenter", "Cluster", "Datastore"]:
+            if not e.get(key): self.error(device, "{} is not set.".format(key))
+        if not e.get("HADatastore"): self.warning(device, "HADatastore is not set.")
+
+        if len(str(e.get("Password") or "")) < 12:
+            self.error(device, "CLI password is not set or shorter than 12 characters.")
+        if not e.get("EnableHighAvailability"): self.warning(device, "HA is not enabled.")
+        if e.get("EnableFIPSmode"): self.warning(device, "FIPS mode is enabled.")
+        if not e.get("EnableSSHaccess"): self.warning(device, "SSH is not enabled.")
+        if kind == "ESG":
+            if not e.get("EnableAutoRuleGeneration"): self.warning(device, "Auto rule generation is disabled.")
+            if e.get("HAvNIC") == "any": self.warning(device, "vNIC for HA heartbeat is not specified.")
+
+        syslog_servers = e["Syslog"].get("SyslogServers")
+        if not syslog_servers: self.warning(device, "Syslog server is not set.")
+        for server in syslog_servers or []:
+            self.check_ip(device, server, "Syslog server")
+
+        interfaces = e["Interfaces"]
+        if not any(i["Type"] == "Uplink" for i in interfaces):
+            self.error(device, "Uplink interface is not set.")
+        for i in interfaces:
+            label = "Interface {}".format(i["Name"])
+            if i["ConnectedTo"] and i["ConnectedTo"] not in self.ls_names:
+                self.warning(device, "{} is connected to {} which is not in ls.json. It must be existing logical switch or port group.".format(label, i["ConnectedTo"]))
+            if i["PrimaryIPAddress"]:
+                self.check_ip(device, i["PrimaryIPAddress"], label + " IP address")
+                length = i["SubnetPrefixLength"]
+                if isinstance(length, bool) or not str(length).strip().isdigit() or int(length) > 32:
+                    self.error(device, "{} prefix length {} is not valid.".format(label, length))
+            secondary = i.get("SecondaryIPAddress")
+            for address in (secondary if isinstance(secondary, list) else str(secondary or "").split(",")):
+                if str(address).strip(): self.check_ip(device, address, label + " secondary IP address")
+
+        if e.get("ConfigureDefaultGateway"):
+            if not e.get("GatewayMTU"): self.error(device, "MTU of default gateway is not set.")
+            if e.get("GatewayAdminDistance") in ("", None): self.error(device, "Admin distance of default gateway is not set.")
+            self.check_ip(device, e.get("GatewayIP"), "Default gateway")
+
+        for r in e["StaticRoute"]:
+            if not r["Network"]: continue
+            self.check_cidr(device, r["Network"], "Static route")
+            self.check_ip(device, r["NextHop"], "Next hop of static route {}".format(r["Network"]))
+
+    def check_dlr(self, e):
+        device = "DLR [{}]".format(e["Name"])
+        if not e.get("ConnectedTo"): self.warning(device, "HA interface is not specified.")
+        if e.get("PrimaryIPAddress"): self.check_ip(device, e["PrimaryIPAddress"], "HA interface IP address")
+        for b in e["Bridge"]:
+            if b["LogicalSwitch"] not in self.ls_names:
+                self.warning(device, "Bridge {} uses {} which is not in ls.json. It must be existing logical switch.".format(b["Name"], b["LogicalSwitch"]))
+
+    def edges(self):
+        for e in self.esg_list: yield ["ESG [{}]".format(e["Name"]), e]
+        for e in self.dlr_list: yield ["DLR [{}]".format(e["Name"]), e]
+
+    # subnets of all interfaces. interfaces connected to the same network share the subnet.
+    def subnets(self):
+        if self._subnets is not None: return self._subnets
+        result = self._subnets = []
+        for device, e in self.edges():
+            for i in e["Interfaces"]:
+                if not i["PrimaryIPAddress"] or parse_ip(i["PrimaryIPAddress"]) is None: continue
+                network = parse_cidr("{}/{}".format(i["PrimaryIPAddress"], i["SubnetPrefixLength"]))
+                if network is None: continue
+                result.append([network, i["ConnectedTo"], "{} interface {}".format(device, i["Name"]), device])
+        return result
+
+    # sweep intervals sorted by start address. active intervals are those whose end is not passed yet.
+    def check_overlaps(self):
+        intervals = sorted(
+            ([int(n.network_address), int(n.broadcast_address), n, connected_to, label, device] for n, connected_to, label, device in self.subnets()),
+            key = lambda x: (x[0], -x[1]))
+
+        active = []
+        reported = set()
+        for start, end, network, connected_to, label, device in intervals:
+            active = [a for a in active if a[1] >= start]
+            for a in active:
+                if a[3] == connected_to: continue
+                key = (a[4], label)
+                if key in reported: continue
+                reported.add(key)
+                self.error(device, "Subnet {} of {} ({}) overlaps with {} of {} ({}).".format(network, label, connected_to, a[2], a[4], a[3]))
+            active.append([start, end, network, connected_to, label, device])
+
+    def check_router_ids(self):
+        owners = {}
+        for device, e in self.edges():
+            router_id = e["GlobalConfiguration"]["RouterId"]
+            if not router_id: continue
+            if parse_ip(router_id) is None or parse_ip(router_id).version != 4:
+                self.error(device, "Router ID {} is not valid IPv4 address.".format(router_id))
+                continue
+            owners.setdefault(str(router_id).strip(), []).append(device)
+        for router_id, devices in owners.items():
+            if len(devices) > 1:
+                for device in devices:
+                    self.error(device, "Router ID {} is duplicated in {}.".format(router_id, ", ".join(devices)))
+
+    def check_bgp(self):
+        # addresses owned by each device. DLR peers with protocol address.
+        owners = {}
+        own_addresses = {}
+        for device, e in self.edges():
+            addresses = own_addresses.setdefault(device, set())
+            for i in e["Interfaces"]:
+                if i["PrimaryIPAddress"]: addresses.add(str(i["PrimaryIPAddress"]).strip())
+            for n in e["Bgp"]["Neighbors"]:
+                if n.get("ProtocolAddress"): addresses.add(str(n["ProtocolAddress"]).strip())
+            for address in addresses:
+                owners[address] = [device, e]
+
+        subnets = {}
+        for network, _, _, device in self.subnets():
+            subnets.setdefault(device, []).append(network)
+
+        for device, e in self.edges():
+            bgp = e["Bgp"]
+            if not bgp["Status"]: continue
+            local_as = parse_as(bgp["LocalAS"])
+            if local_as is None: self.error(device, "Local AS {} is not valid.".format(bgp["LocalAS"]))
+
+            addresses = set()
+            for n in bgp["Neighbors"]:
+                address = str(n["IPAddress"]).strip()
+                if not address: continue
+                label = "BGP neighbor {}".format(address)
+                ip = parse_ip(address)
+                if ip is None:
+                    self.error(device, "{} is not valid IP address.".format(label))
+                    continue
+                if address in addresses: self.error(device, "{} is duplicated.".format(label))
+                addresses.add(address)
+
+                remote_as = parse_as(n["RemoteAS"])
+                if remote_as is None:
+                    self.error(device, "Remote AS {} of {} is not valid.".format(n["RemoteAS"], label))
+                if not any(ip in network for network in subnets.get(device, [])):
+                    self.warning(device, "{} is not in subnets of interfaces.".format(label))
+
+                if address not in owners: continue
+                peer_device, peer = owners[address]
+                if peer_device == device:
+                    self.error(device, "{} is the address of itself.".format(label))
+                    continue
+                peer_bgp = peer["Bgp"]
+                if not peer_bgp["Status"]:
+                    self.error(device, "{} is {}, but BGP of it is disabled.".format(label, peer_device))
+                    continue
+                if remote_as is not None and parse_as(peer_bgp["LocalAS"]) not in (None, remote_as):
+                    self.error(device, "Remote AS {} of {} does not match local AS {} of {}.".format(n["RemoteAS"], label, peer_bgp["LocalAS"], peer_device))
+                if not any(str(pn["IPAddress"]).strip() in own_addresses[device] for pn in peer_bgp["Neighbors"]):
+                    self.warning(device, "{} ({}) has no BGP neighbor to {}.".format(label, peer_device, device))
+
+def validate(ls_list, esg_list, dlr_list):
+    return Validator(ls_list, esg_list, dlr_list).validate()
+
+def errors(problems):
+    return [p for p in problems if p[0] == ERROR]
+
+def print_problems(problems, file = sys.stderr):
+    for level, device, message in problems:
+        print("{:<7} {}: {}".format(level.upper(), device, message), file = file)
+    print("{} errors, {} warnings".format(len(errors(problems)), len(problems) - len(errors(problems))), file = file)
+
+# validate converted files like Validate-NSX -confdir.
+def main():
+    parser = argparse.ArgumentParser(description = "Validate converted JSON files without vCenter and NSX Manager.")
+    parser.add_argument("confdir", nargs = "?", default = ".", help = "directory of ls, esg and dlr files (default: current directory)")
+    args = parser.parse_args()
+
+    try:
+        sections = changeset.load_sections(args.confdir, ["ls", "esg", "dlr"])
+    except ValueError as e:
+        print(e, file = sys.stderr)
+        sys.exit(1)
+
+    problems = validate(*sections)
+    print_problems(problems, sys.stdout)
+    sys.exit(1 if errors(problems) else 0)
+
+if __name__ == '__main__':
+    main()